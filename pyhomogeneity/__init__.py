@@ -1,6 +1,6 @@
-from .pyhomogeneity import pettitt_test, snht_test, buishand_q_test, buishand_range_test, buishand_likelihood_ratio_test, buishand_u_test
+from .pyhomogeneity import pettitt_test, snht_test, buishand_q_test, buishand_range_test, buishand_likelihood_ratio_test, buishand_u_test, snht_two_shift_test, snht_trend_test, variance_lr_test, ragged_test, grouped_test, batch_test, multiresolution_test, stream_test, stream_pettitt_test, cp_confidence, power_curve, BatchResult, LazyResult, resolve, p_value, set_options, get_options, null_distributions, warm_cache, clear_null_cache
 
-__all__ = [pettitt_test, snht_test, buishand_q_test, buishand_range_test, buishand_likelihood_ratio_test, buishand_u_test]
+__all__ = [pettitt_test, snht_test, buishand_q_test, buishand_range_test, buishand_likelihood_ratio_test, buishand_u_test, snht_two_shift_test, snht_trend_test, variance_lr_test, ragged_test, grouped_test, batch_test, multiresolution_test, stream_test, stream_pettitt_test, cp_confidence, power_curve, BatchResult, LazyResult, resolve, p_value, set_options, get_options, null_distributions, warm_cache, clear_null_cache]
 
 from ._version import get_versions
 __version__ = get_versions()['version']
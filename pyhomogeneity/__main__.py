@@ -0,0 +1,65 @@
+"""
+Command line interface of pyhomogeneity.
+
+    python -m pyhomogeneity warm-cache --tests all --n 10:2000 --sim 100000 --jobs 32 --store nulls.phg
+"""
+
+import sys
+import argparse
+from .pyhomogeneity import set_options, warm_cache
+
+
+# Sample sizes from 'start:stop[:step]' (stop included) or a comma separated list
+def __sizes(text):
+    if ':' in text:
+        parts = [int(v) for v in text.split(':')]
+        
+        return range(parts[0], parts[1] + 1, parts[2] if len(parts) > 2 else 1)
+    
+    return [int(v) for v in text.split(',')]
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog='python -m pyhomogeneity')
+    commands = parser.add_subparsers(dest='command')
+    
+    warm = commands.add_parser('warm-cache', help='precompute seeded null distributions into a null store')
+    warm.add_argument('--tests', default='all', help="'all' or comma separated test names (default all)")
+    warm.add_argument('--n', required=True, help="sample sizes, 'start:stop[:step]' or a comma separated list")
+    warm.add_argument('--sim', type=int, default=20000, help='No. of simulation (default 20000)')
+    warm.add_argument('--seed', type=int, default=0, help='seed used by the later runs as random_state (default 0)')
+    warm.add_argument('--method', default='mc', choices=['mc', 'qmc', 'control'], help='simulation method (default mc)')
+    warm.add_argument('--jobs', type=int, default=1, help='No. of worker processes (default 1)')
+    warm.add_argument('--store', default=None, help='null store file (default $PYHOMOGENEITY_NULL_STORE)')
+    warm.add_argument('--compact', action='store_true', help='store compact quantile grids (compact_cache option)')
+    warm.add_argument('--sketch-error', type=float, default=0.01, help='relative error of compact nulls (default 0.01)')
+    
+    args = parser.parse_args(argv)
+    
+    if args.command != 'warm-cache':
+        parser.print_help()
+        return 2
+    
+    options = dict(compact_cache=args.compact, sketch_error=args.sketch_error)
+    
+    if args.store:
+        options['null_store'] = args.store
+    
+    old = set_options(**options)
+    tests = args.tests if args.tests == 'all' else args.tests.split(',')
+    
+    try:
+        res = warm_cache(tests, __sizes(args.n), args.sim, args.seed, args.method, args.jobs, verbose=True)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        set_options(**old)
+    
+    print('{} null distributions simulated, {} already stored, {:.1f} s, {:.0f} series/s'.format(
+        res.n_nulls, res.n_skipped, res.seconds, res.series_per_second))
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
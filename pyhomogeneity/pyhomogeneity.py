@@ -7,10 +7,27 @@ Approach: Vectorisation
 """
 
 from __future__ import division
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from scipy.stats import rankdata
+from scipy.stats import rankdata, qmc, genpareto, kstwobign
+from scipy.stats import beta as beta_dist
+from scipy.special import ndtr, ndtri, gammaln, kv
+from scipy.optimize import brentq
+from scipy.signal import lfilter
 from collections import namedtuple
 
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, use one writer per store
+    fcntl = None
+
 
 # Supporting Functions
 # Data Preprocessing
@@ -58,6 +75,68 @@ def __missing_values_analysis(x, idx, method = 'skip'):
     return x, n, idx
 
 
+# Season (0-based month or day of a 365 day year, Feb 29 sharing Feb 28) of every value from the
+# dates parsed by __preprocessing
+def __season_codes(idx, kind):
+    if kind not in ('month', 'dayofyear'):
+        raise ValueError("deseasonalize must be 'month' or 'dayofyear'.")
+    
+    if np.issubdtype(np.asarray(idx).dtype, np.integer):
+        raise ValueError('deseasonalize needs a pandas series or dataframe with a datetime index.')
+    
+    dt = np.asarray(idx).astype('datetime64[D]')
+    
+    if kind == 'month':
+        return dt.astype('datetime64[M]').astype(int) % 12, 12
+    
+    day = (dt - dt.astype('datetime64[Y]')).astype(int)
+    year = dt.astype('datetime64[Y]').astype(int) + 1970
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    
+    return day - (leap & (day >= 59)), 365
+
+
+# Batch preprocessing of c series (rows of x, nan for missing values), in place and vectorized
+# across series: anomalies from the climatology of every season (season = (codes, No. of
+# seasons)), removal of the least squares linear trend and AR(1) prewhitening
+# y_t = e_t - phi e_(t-1), y_0 = sqrt(1 - phi**2) e_0 of the deviations e from the mean
+# (a value after a missing one restarts the filter like y_0, so a gap removes only itself)
+def __batch_preprocessing(x, detrend = False, prewhiten = False, season = None):
+    valid = ~np.isnan(x)
+    t = np.arange(x.shape[1], dtype=float)
+    cnt = valid.sum(axis=1)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if season is not None:
+            # one bincount over (series, season) pairs gives every climatology at once
+            codes, S = season
+            key = codes + S * np.arange(len(x))[:, None]
+            count = np.bincount(key[valid], None, len(x) * S)
+            
+            # a single value is its own climatology, its anomaly is always 0
+            if (count == 1).any():
+                raise ValueError('deseasonalize needs at least 2 valid values in every season of every series.')
+            
+            clim = np.bincount(key[valid], x[valid], len(x) * S) / count
+            x -= clim[key]
+        
+        if detrend:
+            dt = np.where(valid, t - (valid * t).sum(axis=1, keepdims=True) / cnt[:, None], 0)
+            slope = (dt * np.where(valid, x, 0)).sum(axis=1) / (dt ** 2).sum(axis=1)
+            x -= np.nan_to_num(slope)[:, None] * t
+        
+        if prewhiten:
+            x -= (np.where(valid, x, 0).sum(axis=1) / cnt)[:, None]
+            e = np.where(valid, x, 0)
+            phi = np.clip(np.nan_to_num((e[:, 1:] * e[:, :-1]).sum(axis=1) / (e ** 2).sum(axis=1)), -0.99, 0.99)
+            # e is 0 at the gaps, so the first value after a gap is only scaled as y_0
+            start = np.c_[np.ones((len(x), 1), bool), ~valid[:, :-1]]
+            x[:, 1:] -= phi[:, None] * e[:, :-1]
+            x *= np.where(start, np.sqrt(1 - phi ** 2)[:, None], 1)
+    
+    return x
+
+
 # Pettitt test
 def __pettitt(x):
     n = len(x)
@@ -136,194 +215,2900 @@ def __buishand_u(x):
     return U, abs(S).argmax() + 1
 
 
-# Monte carlo simulation for p-value calculation
-def __mc_p_value(func, stat, n, sim): 
-    rand_data = np.random.normal(0, 1, [sim, n])
-    res = np.asarray(list(map(func, rand_data)))
-    p_val = (res[:,0] > stat).sum() / sim
+# Likelihood ratio of a variance change at k, from the running sums Q of squared deviations from the
+# overall mean (total ss), with at least 2 values on each side
+def __variance_lr_profile(Q, ss, k, n):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        L = n * np.log(ss / n) - k * np.log(Q / k) - (n - k) * np.log((ss - Q) / (n - k))
     
-    return p_val
+    return np.where((k >= 2) & (k <= n - 2), np.nan_to_num(L, nan=-np.inf), -np.inf)
 
 
-# Mean calculation
-def __mean(x, loc):
-    mu = namedtuple('mean',['mu1', 'mu2'])
-    mu1 = x[:loc].mean()
-    mu2 = x[loc:].mean()
+# Variance change likelihood ratio test statistics
+def __variance_lr(x):
+    n = len(x)
+    k = np.arange(1, n + 1)
+    Q = ((x - x.mean()) ** 2).cumsum()
+    L = __variance_lr_profile(Q, Q[-1], k, n)
     
-    return mu(mu1, mu2)
+    return L.max(), L.argmax() + 1
 
 
-# Homogeneity test
-def __test(func, x, alpha, sim):
-    x, c, idx = __preprocessing(x)
-    x, n, idx = __missing_values_analysis(x, idx, method = 'skip')
+# Two-shift and trend-shift SNHT (Alexandersson and Moberg, 1997): the explained sum of squares of
+# the standardized series by three means, or by two means joined by a linear transition, at every
+# pair of break points 1 <= a < b < n. The pairs are evaluated from the prefix sums of every row
+# in blocks of a, so that each block holds about chunk values
+def __two_break_stat(test, X, chunk = 2**22):
+    X = np.atleast_2d(np.asarray(X, dtype=float))
+    m, n = X.shape
+    d = X - X.mean(axis=1, keepdims=True)
+    S = d.cumsum(axis=1)
+    W = (d * np.arange(1, n + 1)).cumsum(axis=1)
+    var = (d ** 2).sum(axis=1) / (n - 1)
     
-    stat, loc = func(x)
+    best = np.full(m, np.nan)
+    ka = np.ones(m, dtype=int)
+    kb = np.ones(m, dtype=int)
     
-    if sim:
-        p = __mc_p_value(func, stat, n, sim)
-        h = alpha > p
+    if n < 3:
+        return best, ka, kb
+    
+    best[:] = -np.inf
+    B = np.arange(2, n)
+    rows = max(1, chunk // n**2)
+    
+    for r in range(0, m, rows):
+        R = slice(r, r + rows)
+        
+        for a0 in range(1, n - 1, max(1, chunk // (min(rows, m - r) * n))):
+            A = np.arange(a0, min(a0 + max(1, chunk // (min(rows, m - r) * n)), n - 1))
+            a, b = A[:, None], B[None, :]
+            Sa, Sb = S[R][:, A - 1, None], S[R][:, None, B - 1]
+            
+            with np.errstate(divide='ignore', invalid='ignore'):
+                if test == 'snht_two_shift':
+                    T = Sa ** 2 / a + (Sb - Sa) ** 2 / (b - a) + Sb ** 2 / (n - b)
+                else:
+                    L = b - a
+                    hd = (W[R][:, None, B - 1] - W[R][:, A - 1, None] - a * (Sb - Sa)) / L - Sb
+                    sh = (L + 1) / 2 + (n - b)
+                    sh2 = (L + 1) * (2 * L + 1) / (6 * L) + (n - b)
+                    T = hd ** 2 / (sh2 - sh ** 2 / n)
+            
+            T = np.where(b > a, T, -np.inf).reshape(len(T), -1)
+            i = T.argmax(axis=1)
+            t = T[np.arange(len(T)), i]
+            better = t > best[R]
+            best[R] = np.where(better, t, best[R])
+            ka[R] = np.where(better, A[i // len(B)], ka[R])
+            kb[R] = np.where(better, B[i % len(B)], kb[R])
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return best / var, ka, kb
+
+
+def __snht_two_shift(x):
+    T, a, b = __two_break_stat('snht_two_shift', x)
+    
+    return T[0], (a[0], b[0])
+
+
+def __snht_trend(x):
+    T, a, b = __two_break_stat('snht_trend', x)
+    
+    return T[0], (a[0], b[0])
+
+
+# Mean values of the fitted two-shift (three means) or trend-shift (levels before a and after b) model
+def __two_break_mean(test, x, loc):
+    a, b = loc
+    
+    if test == 'snht_two_shift':
+        mu = namedtuple('mean', ['mu1', 'mu2', 'mu3'])
+        
+        return mu(x[:a].mean(), x[a:b].mean(), x[b:].mean())
+    
+    mu = namedtuple('mean', ['mu1', 'mu2'])
+    h = np.clip((np.arange(1, len(x) + 1) - a) / (b - a), 0, 1)
+    beta = ((h - h.mean()) * x).sum() / ((h - h.mean()) ** 2).sum()
+    c = x.mean() - beta * h.mean()
+    
+    return mu(c, c + beta)
+
+
+# Lag-1 autocorrelation of the residuals around the fitted two break point model, as in __batch_lag1
+def __two_break_lag1(test, x):
+    n = len(x)
+    loc = __tests[test](x)[1]
+    mu = __two_break_mean(test, x, loc)
+    
+    if test == 'snht_two_shift':
+        fit = np.repeat(mu, np.diff(np.r_[0, loc, n]))
     else:
-        p = None
-        h = None
+        fit = mu.mu1 + (mu.mu2 - mu.mu1) * np.clip((np.arange(1, n + 1) - loc[0]) / (loc[1] - loc[0]), 0, 1)
     
-    mu = __mean(x, loc)
+    return __batch_lag1((x - fit)[None, :], __dense_layout(1, n), np.array([n]), np.zeros(1), np.zeros(1))
+
+
+# Single series statistics and statistic names of each homogeneity test
+__tests = {'pettitt': __pettitt, 'snht': __snht, 'buishand_q': __buishand_q,
+           'buishand_range': __buishand_range, 'buishand_likelihood_ratio': __buishand_lr,
+           'buishand_u': __buishand_u, 'snht_two_shift': __snht_two_shift, 'snht_trend': __snht_trend,
+           'variance_lr': __variance_lr}
+
+# tests with two break points, O(n^2) per series
+__two_break = ('snht_two_shift', 'snht_trend')
+
+# No. of valid values a test needs (2 for the others), shorter series are not tested
+__min_length = {'snht_two_shift': 3, 'snht_trend': 3, 'variance_lr': 4}
+
+__stat_names = {'pettitt': 'U', 'snht': 'T', 'buishand_q': 'Q', 'buishand_range': 'R',
+                'buishand_likelihood_ratio': 'V', 'buishand_u': 'U', 'snht_two_shift': 'T', 'snht_trend': 'T',
+                'variance_lr': 'L'}
+
+
+# Batch layout: a dense (m, width) block or flat ragged values split by offsets
+__Layout = namedtuple('layout', ['n', 'starts', 'seg', 'k', 'width'])
+
+
+def __dense_layout(m, n):
+    return __Layout(np.full(m, n), None, None, np.arange(1, n+1), n)
+
+
+def __ragged_layout(offsets):
+    n = np.diff(offsets)
+    starts = offsets[:-1]
+    seg = np.repeat(np.arange(len(n)), n)
+    k = np.arange(offsets[-1]) - starts[seg] + 1
     
-    return h, idx[loc-1], p, stat, mu
+    return __Layout(n, starts, seg, k, None)
 
 
-def pettitt_test(x, alpha = 0.05, sim = 20000):
-    """
-    This function checks homogeneity test using A. N. Pettitt's (1979) method.
-    Input:
-        x: a vector (list, numpy array or pandas series) data
-        alpha: significance level (default 0.05)
-        sim: No. of monte carlo simulation for p-value calculation (default 20000)
-    Output:
-        h: True (if data is nonhomogeneous) or False (if data is homogeneous)
-        cp: probable change-point location index
-        p: p-value of the significance test
-        U: Maximum of absolute Pettitt's U Statistics
-        avg: mean values at before and after change-point
-    Examples
-    --------
-      >>> import pyhomogeneity as hg
-      >>> x = np.random.rand(1000)
-      >>> h, cp, p, U, mu = hg.pettitt_test(x, 0.05)
-    """
-    res = namedtuple('Pettitt_Test', ['h', 'cp', 'p', 'U', 'avg'])
-    h, cp, p, U, mu = __test(__pettitt, x, alpha, sim)
+# Per-series value broadcast back to every element of the series
+def __expand(layout, a):
+    if layout.width:
+        return np.asarray(a)[:, None]
     
-    if not sim:
-        x, c, idx = __preprocessing(x)
-        x, n, idx = __missing_values_analysis(x, idx, method = 'skip')
-        p = 2 * np.exp((- 6 * U**2) / (n**3 + n**2))
-        h = alpha > p
+    return np.asarray(a)[layout.seg]
+
+
+# Segmented reduction (np.add, np.maximum, np.minimum)
+def __reduce(layout, ufunc, v):
+    if layout.width:
+        return ufunc.reduce(v, axis=1)
     
-    return res(h, cp, p, U, mu)
+    return ufunc.reduceat(v, layout.starts)
 
 
-def snht_test(x, alpha = 0.05, sim = 20000):
-    """
-    This function checks homogeneity test using H. Alexandersson (1986) method.
-    Input:
-        x: a vector (list, numpy array or pandas series) data
-        alpha: significance level (default 0.05)
-        sim: No. of monte carlo simulation for p-value calculation (default 20000)
-    Output:
-        h: True (if data is nonhomogeneous) or False (if data is homogeneous)
-        cp: probable change-point location index
-        p: p-value of the significance test
-        T: Maximum of SNHT T Statistics
-        avg: mean values at before and after change-point
-    Examples
-    --------
-      >>> import pyhomogeneity as hg
-      >>> x = np.random.rand(1000)
-      >>> h, cp, p, T, mu = hg.snht_test(x, 0.05)
-    """
-    res = namedtuple('SNHT_Test', ['h', 'cp', 'p', 'T', 'avg'])
-    h, cp, p, T, mu = __test(__snht, x, alpha, sim)
+# Segmented cumulative sum
+def __cumsum(layout, v):
+    if layout.width:
+        return v.cumsum(axis=1)
+    
+    c = v.cumsum()
+    
+    return c - (c[layout.starts] - v[layout.starts])[layout.seg]
 
-    return res(h, cp, p, T, mu)
 
+# Segmented maximum and its first (1-based) location
+def __argmax(layout, v):
+    if layout.width:
+        loc = v.argmax(axis=1)
+        
+        return v[np.arange(len(v)), loc], loc + 1
+    
+    vmax = np.maximum.reduceat(v, layout.starts)
+    hit = v == vmax[layout.seg]
+    loc = np.minimum.reduceat(np.where(hit, layout.k, np.iinfo(np.intp).max), layout.starts)
+    
+    return vmax, loc
 
-def buishand_q_test(x, alpha = 0.05, sim = 20000):
-    """
-    This function checks homogeneity test using Buishand's Q statistics method proposed in T. A. Buishand (1982).
-    Input:
-        x: a vector (list, numpy array or pandas series) data
-        alpha: significance level (default 0.05)
-        sim: No. of monte carlo simulation for p-value calculation (default 20000)
-    Output:
-        h: True (if data is nonhomogeneous) or False (if data is homogeneous)
-        cp: probable change-point location index
-        p: p-value of the significance test
-        Q: Maximum of absolute Buishand's Q Statistics divided by squire root of sample size [Q/sqrt(n)]
-        avg: mean values at before and after change-point
-    Examples
-    --------
-      >>> import pyhomogeneity as hg
-      >>> x = np.random.rand(1000)
-      >>> h, cp, p, Q, mu = hg.buishand_q_test(x, 0.05)
-    """
-    res = namedtuple('Buishand_Q_Test', ['h', 'cp', 'p', 'Q', 'avg'])
-    h, cp, p, Q, mu = __test(__buishand_q, x, alpha, sim)
 
-    return res(h, cp, p, Q, mu)
+# Segmented average ranks (ties get their mean rank, as in rankdata)
+def __rank(layout, x):
+    if layout.width:
+        return rankdata(x, axis=1)
+    
+    order = np.lexsort((x, layout.seg))
+    xs = x[order]
+    ss = layout.seg[order]
+    
+    new = np.r_[True, (xs[1:] != xs[:-1]) | (ss[1:] != ss[:-1])]
+    grp = new.cumsum() - 1
+    pos = np.arange(len(x)) - layout.starts[ss] + 1
+    avg = pos[new] + (np.bincount(grp) - 1) / 2
+    
+    r = np.empty(len(x))
+    r[order] = avg[grp]
+    
+    return r
 
 
-def buishand_range_test(x, alpha = 0.05, sim = 20000):
-    """
-    This function checks homogeneity test using Buishand's range method proposed in T. A. Buishand (1982).
-    Input:
-        x: a vector (list, numpy array or pandas series) data
-        alpha: significance level (default 0.05)
-        sim: No. of monte carlo simulation for p-value calculation (default 20000)
-    Output:
-        h: True (if data is nonhomogeneous) or False (if data is homogeneous)
-        cp: probable change-point location index
-        p: p-value of the significance test
-        R: Buishand's Q Statistics range divided by squire root of sample size [R/sqrt(n)]
-        avg: mean values at before and after change-point
-    Examples
-    --------
-      >>> import pyhomogeneity as hg
-      >>> x = np.random.rand(1000)
-      >>> h, cp, p, R, mu = hg.buishand_range_test(x, 0.05)
-    """
-    res = namedtuple('Buishand_Range_Test', ['h', 'cp', 'p', 'R', 'avg'])
-    h, cp, p, R, mu = __test(__buishand_range, x, alpha, sim)
+# Shared running sums of every series of a batch: the mean, deviations d from it, their running
+# sums S and total ss, and (for variance tests) the running sums Q of d^2, computed once for all tests
+__Prefix = namedtuple('prefix', ['mean', 'd', 'S', 'ss', 'Q'])
 
-    return res(h, cp, p, R, mu)
 
+def __batch_prefix(x, layout, squares = False):
+    mean = __reduce(layout, np.add, x) / layout.n
+    d = x - __expand(layout, mean)
+    
+    return __Prefix(mean, d, __cumsum(layout, d), __reduce(layout, np.add, d ** 2), __cumsum(layout, d ** 2) if squares else None)
 
-def buishand_likelihood_ratio_test(x, alpha = 0.05, sim = 20000):
-    """
-    This function checks homogeneity test using Buishand's likelihood ration method proposed in T. A. Buishand (1984).
-    Input:
-        x: a vector (list, numpy array or pandas series) data
-        alpha: significance level (default 0.05)
-        sim: No. of monte carlo simulation for p-value calculation (default 20000)
-    Output:
-        h: True (if data is nonhomogeneous) or False (if data is homogeneous)
-        cp: probable change-point location index
-        p: p-value of the significance test
-        V: Maximum of absolute Buishand's weighted adjusted partial sum S
-        avg: mean values at before and after change-point
-    Examples
-    --------
-      >>> import pyhomogeneity as hg
-      >>> x = np.random.rand(1000)
-      >>> h, cp, p, V, mu = hg.buishand_range_test(x, 0.05)
-    """
-    res = namedtuple('Buishand_Likelihood_Ratio_Test', ['h', 'cp', 'p', 'V', 'avg'])
-    h, cp, p, V, mu = __test(__buishand_lr, x, alpha, sim)
 
-    return res(h, cp, p, V, mu)
+# Vectorized test statistics for every series of a batch
+def __batch_stat(test, x, layout, pre = None):
+    n = layout.n
+    k = layout.k
+    nk = __expand(layout, n)
+    inner = k < nk
+    
+    if test in __two_break:
+        return __batch_two_break(test, x, layout)
+    
+    if test == 'pettitt':
+        U = 2 * __cumsum(layout, __rank(layout, x) - __expand(layout, (n + 1) / 2))
+        
+        return __argmax(layout, np.where(inner, abs(U), -np.inf))
+    
+    if pre is None:
+        pre = __batch_prefix(x, layout, test == 'variance_lr')
+    
+    S, ss = pre.S, pre.ss
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if test == 'snht':
+            T = S ** 2 * nk / (k * (nk - k)) / __expand(layout, ss / (n - 1))
+            
+            return __argmax(layout, np.where(inner, T, -np.inf))
+        
+        if test == 'variance_lr':
+            return __argmax(layout, __variance_lr_profile(pre.Q, __expand(layout, ss), k, nk))
+        
+        sd = np.sqrt(ss / n)
+        loc = __argmax(layout, abs(S))[1]
+        
+        if test == 'buishand_q':
+            stat = __reduce(layout, np.maximum, abs(S)) / sd / np.sqrt(n)
+            
+        elif test == 'buishand_range':
+            stat = (__reduce(layout, np.maximum, S) - __reduce(layout, np.minimum, S)) / sd / np.sqrt(n)
+            
+        elif test == 'buishand_likelihood_ratio':
+            V = np.where(inner, abs(S) / np.sqrt(k * (nk - k)), -np.inf)
+            stat = __reduce(layout, np.maximum, V) / sd
+            
+        elif test == 'buishand_u':
+            stat = __reduce(layout, np.add, np.where(inner, S ** 2, 0)) / sd ** 2 / (n * (n + 1))
+            
+        else:
+            raise ValueError('Unknown homogeneity test: {}'.format(test))
+    
+    return stat, loc
 
 
-def buishand_u_test(x, alpha = 0.05, sim = 20000):
-    """
-    This function checks homogeneity test using Buishand's U statistics method method proposed in T. A. Buishand (1984).
-    Input:
-        x: a vector (list, numpy array or pandas series) data
-        alpha: significance level (default 0.05)
-        sim: No. of monte carlo simulation for p-value calculation (default 20000)
-    Output:
-        h: True (if data is nonhomogeneous) or False (if data is homogeneous)
-        cp: probable change-point location index
-        p: p-value of the significance test
-        U: Buishand's U Statistics
-        avg: mean values at before and after change-point
-    Examples
-    --------
-      >>> import pyhomogeneity as hg
-      >>> x = np.random.rand(1000)
-      >>> h, cp, p, U, mu = hg.buishand_u_test(x, 0.05)
-    """
-    res = namedtuple('Buishand_U_Test', ['h', 'cp', 'p', 'U', 'avg'])
-    h, cp, p, U, mu = __test(__buishand_u, x, alpha, sim)
+# Two break point statistics of a batch, series of the same length at once; the location is the
+# first break point
+def __batch_two_break(test, x, layout):
+    if layout.width:
+        T, a, b = __two_break_stat(test, x)
+        
+        return T, a
+    
+    stat = np.empty(len(layout.n))
+    loc = np.empty(len(layout.n), dtype=int)
+    
+    for n in np.unique(layout.n):
+        i = np.flatnonzero(layout.n == n)
+        T, a, b = __two_break_stat(test, x[layout.starts[i, None] + np.arange(n)])
+        stat[i], loc[i] = T, a
+    
+    return stat, loc
+
+
+# Control variate of every series of a batch: profile mean of the squared standardized
+# partial sums, whose expectation under the iid null is exactly 1 for any n
+def __batch_control(test, x, layout):
+    n = layout.n
+    k = layout.k
+    nk = __expand(layout, n)
+    inner = k < nk
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if test == 'pettitt':
+            U = 2 * __cumsum(layout, __rank(layout, x) - __expand(layout, (n + 1) / 2))
+            C = U ** 2 * 3 / (k * (nk - k) * (nk + 1))
+        else:
+            d = x - __expand(layout, __reduce(layout, np.add, x) / n)
+            S = __cumsum(layout, d)
+            C = S ** 2 * nk / (k * (nk - k)) / __expand(layout, __reduce(layout, np.add, d ** 2) / (n - 1))
+    
+    return __reduce(layout, np.add, np.where(inner, C, 0)) / (n - 1)
+
+
+# Mean values at before and after change-point for every series of a batch
+def __batch_mean(x, layout, loc, pre = None):
+    n = layout.n
+    pre = pre or __batch_prefix(x, layout)
+    mean, S = pre.mean, pre.S
+    
+    if layout.width:
+        S = S[np.arange(len(n)), loc - 1]
+    else:
+        S = S[layout.starts + loc - 1]
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mu1 = mean + S / loc
+        mu2 = mean - S / (n - loc)
+    
+    return mu1, mu2
+
 
-    return res(h, cp, p, U, mu)
\ No newline at end of file
+# Standard deviations (ddof = 1) before and after loc of every series, from the running sums Q of
+# squared deviations from the series mean and the means mu1, mu2 of the two segments
+def __batch_sd(x, layout, loc, mu1, mu2, pre):
+    n = layout.n
+    
+    if layout.width:
+        Q = pre.Q[np.arange(len(n)), loc - 1]
+    else:
+        Q = pre.Q[layout.starts + loc - 1]
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sd1 = np.sqrt(np.maximum(Q - loc * (mu1 - pre.mean) ** 2, 0) / (loc - 1))
+        sd2 = np.sqrt(np.maximum(pre.ss - Q - (n - loc) * (mu2 - pre.mean) ** 2, 0) / (n - loc - 1))
+    
+    return sd1, sd2
+
+
+# Package wide options of the monte carlo p-value calculation
+__options = {'bit_generator': 'PCG64', 'dtype': 'float64', 'common_random_numbers': True, 'cache': True,
+             'qmc_replicates': 16, 'tail': None, 'tail_fraction': 0.05, 'compact_cache': False,
+             'sketch_error': 0.01, 'null_store': os.environ.get('PYHOMOGENEITY_NULL_STORE'), 'threads': 1,
+             'bootstrap': 'stationary', 'block_length': None, 'ar1_step': 0.05}
+
+# Null distributions of seeded (reproducible) simulations
+__null_cache = {}
+
+# Simulated null distribution: sorted statistics (one sorted row per scramble for qmc),
+# for control variates suffix sums of the control and its square in the same order, a dict
+# of fitted tail models filled on first use (so it is cached with the null) and the No. of
+# simulated series. A compacted null ('sketch') keeps only a grid of statistics with their
+# p-values and standard errors (see __compact_null).
+__Null = namedtuple('null', ['method', 'stat', 'control', 'tail', 'n_sim'])
+
+__methods = ('mc', 'qmc', 'control')
+
+# Methods resampling the observed series, whose nulls are neither shared nor cached
+__resampling = ('permutation', 'block_bootstrap')
+
+# Range of the AR(1) null grid in phi (internally the method is ('ar1', phi) per grid point)
+__ar1_range = (-0.5, 0.95)
+
+
+# Random generator and cache key for a simulation of series of length n
+def __random_generator(random_state, n, test):
+    if random_state is None:
+        return None, None
+    
+    if isinstance(random_state, np.random.Generator):
+        return random_state, None
+    
+    if isinstance(random_state, np.random.SeedSequence):
+        entropy, key = random_state.entropy, tuple(random_state.spawn_key)
+    else:
+        entropy, key = int(random_state), ()
+    
+    # common random numbers: every test draws the same stream for a given n
+    key += (n,) if __options['common_random_numbers'] else (n, test)
+    seq = np.random.SeedSequence(entropy, spawn_key=key)
+    rng = np.random.Generator(getattr(np.random, __options['bit_generator'])(seq))
+    
+    return rng, (entropy, key, __options['bit_generator'], __options['dtype'], __options['qmc_replicates'])
+
+
+# Standard normal (size, n) block, numpy's global state is used when rng is None
+def __normal(rng, size, n):
+    if rng is None:
+        return np.random.normal(0, 1, [size, n]).astype(__options['dtype'], copy=False)
+    
+    return rng.standard_normal((size, n), dtype=__options['dtype'])
+
+
+# No. of simulated series actually used (qmc rounds every scramble up to a power of 2)
+def __n_sim(method, sim):
+    if method == 'qmc':
+        reps = __options['qmc_replicates']
+        
+        return reps * 2 ** int(np.ceil(np.log2(max(1, sim / reps))))
+    
+    return sim
+
+
+# Simulated standard normal blocks as (replicate, block) pairs; qmc uses independently
+# scrambled Sobol sequences of 2**m points each, mapped through the inverse normal cdf
+def __draws(method, rng, n, sim, chunk = 2**20):
+    rows = 2 ** int(np.log2(max(1, chunk // n)))
+    
+    if method != 'qmc':
+        phi = method[1] if isinstance(method, tuple) else 0
+        
+        for i in range(0, sim, rows):
+            block = __normal(rng, min(rows, sim - i), n)
+            
+            if phi:
+                # stationary AR(1): the first innovation is scaled to the stationary variance
+                block[:, 0] /= np.sqrt(1 - phi ** 2)
+                block = lfilter([1], [1, -phi], block, axis=1).astype(block.dtype, copy=False)
+            
+            yield 0, block
+        
+        return
+    
+    if n > 21201:
+        raise ValueError('qmc supports series up to 21201 values.')
+    
+    reps = __options['qmc_replicates']
+    size = __n_sim(method, sim) // reps
+    
+    for r in range(reps):
+        sobol = qmc.Sobol(n, scramble=True, seed=rng if rng is not None else np.random.randint(2**31))
+        
+        for i in range(0, size, rows):
+            u = np.clip(sobol.random(min(rows, size - i)), 2**-53, 1 - 2**-53)
+            yield r, ndtri(u).astype(__options['dtype'], copy=False)
+
+
+# Null distributions of several tests computed from the same simulated blocks
+def __simulate_nulls(tests, n, sim, random_state = None, method = 'mc'):
+    rng, key = __random_generator(random_state, n, tests[0])
+    stat = dict((test, {}) for test in tests)
+    control = dict((test, []) for test in tests)
+    
+    for r, rand_data in __draws(method, rng, n, sim):
+        layout = __dense_layout(len(rand_data), n)
+        
+        # running sums shared by the mean and variance tests
+        pre = __batch_prefix(rand_data, layout, 'variance_lr' in tests)
+        
+        for test in tests:
+            stat[test].setdefault(r, []).append(__batch_stat(test, rand_data, layout, pre)[0])
+            
+            if method == 'control':
+                control[test].append(__batch_control(test, rand_data, layout))
+    
+    res = {}
+    sim = __n_sim(method, sim)
+    
+    for test in tests:
+        if method == 'qmc':
+            res[test] = __Null(method, np.sort([np.concatenate(stat[test][r]) for r in sorted(stat[test])], axis=1), None, {}, sim)
+            
+        elif method == 'control':
+            t = np.concatenate(stat[test][0])
+            order = np.argsort(t)
+            c = np.concatenate(control[test])[order]
+            suffix = np.array([np.r_[np.cumsum(v[::-1])[::-1], 0] for v in [c, c ** 2]])
+            res[test] = __Null(method, t[order], suffix, {}, sim)
+            
+        else:
+            res[test] = __Null('mc', np.sort(np.concatenate(stat[test][0])), None, {}, sim)
+    
+    return res
+
+
+# On-disk null store shared by processes: a file header followed by append-only records of
+# [magic, record length, header length, json header, arrays aligned to 64 bytes, end marker].
+# Writers append under an exclusive lock and readers take a shared lock only to scan new
+# record headers; the arrays are read-only views of a memory map of the file, so every
+# process shares one copy through the page cache.
+__STORE_MAGIC = b'PYHGNUL1'
+__RECORD = struct.Struct('<4sQI')
+__RECORD_END = b'PHRE'
+
+# Per path state of the opened stores: index of the records, scanned size and memory map
+__stores = {}
+
+
+def __lock(f, exclusive = False):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+
+def __unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+# Index the records added since the last scan; returns the end of the complete records
+def __store_scan(path, state, f):
+    size = os.fstat(f.fileno()).st_size
+    pos = max(state['size'], len(__STORE_MAGIC))
+    f.seek(0)
+    
+    if f.read(len(__STORE_MAGIC)) not in (__STORE_MAGIC, b''):
+        raise ValueError('{} is not a pyhomogeneity null store.'.format(path))
+    
+    while pos + __RECORD.size <= size:
+        f.seek(pos)
+        magic, length, head = __RECORD.unpack(f.read(__RECORD.size))
+        
+        # unfinished records have length 0 until their end marker is on disk
+        if magic != b'PHRC' or length <= __RECORD.size + head or pos + length > size:
+            break
+        
+        f.seek(pos + length - len(__RECORD_END))
+        
+        if f.read(len(__RECORD_END)) != __RECORD_END:
+            break
+        
+        f.seek(pos + __RECORD.size)
+        header = json.loads(f.read(head).decode('utf-8'))
+        data = pos + __RECORD.size + head
+        state['index'][header['key']] = (data + -data % 64, header)
+        pos += length
+    
+    if pos > state['size']:
+        state['size'] = pos
+        state['mm'] = None
+    
+    return pos
+
+
+def __store_state(path):
+    return __stores.setdefault(os.path.abspath(path), {'index': {}, 'size': 0, 'mm': None})
+
+
+def __store_key(key):
+    compact = __options['sketch_error'] if __options['compact_cache'] else None
+    
+    return json.dumps(list(key) + [compact], default=int)
+
+
+# Null distribution of a cache key from the store, or None
+def __store_get(path, key):
+    if not os.path.exists(path):
+        return None
+    
+    state = __store_state(path)
+    key = __store_key(key)
+    
+    if key not in state['index']:
+        with open(path, 'rb') as f:
+            __lock(f)
+            
+            try:
+                __store_scan(path, state, f)
+            finally:
+                __unlock(f)
+    
+    if key not in state['index']:
+        return None
+    
+    if state['mm'] is None:
+        with open(path, 'rb') as f:
+            state['mm'] = mmap.mmap(f.fileno(), state['size'], access=mmap.ACCESS_READ)
+    
+    data, header = state['index'][key]
+    arrays = [None if a is None else np.frombuffer(state['mm'], a[0], int(np.prod(a[1])), data + a[2]).reshape(a[1])
+              for a in header['arrays']]
+    tail = dict((tuple(k), tuple(np.array(x) if isinstance(x, list) else x for x in v) if v else None)
+                for k, v in header['tail'])
+    
+    return __Null(header['method'], arrays[0], arrays[1], tail, header['n_sim'])
+
+
+# Append the null distribution of a cache key to the store. The record length is written
+# last, so readers never see a partial record, and a torn record left by a crashed writer
+# is cut off by the next one.
+def __store_put(path, key, null):
+    state = __store_state(path)
+    key = __store_key(key)
+    
+    with os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b') as f:
+        __lock(f, exclusive=True)
+        
+        try:
+            end = __store_scan(path, state, f)
+            
+            if key in state['index']:
+                return
+            
+            f.truncate(end)
+            
+            if end == len(__STORE_MAGIC):
+                f.seek(0)
+                f.write(__STORE_MAGIC)
+            
+            arrays = [None if a is None else np.ascontiguousarray(a) for a in (null.stat, null.control)]
+            specs, offset = [], 0
+            
+            for a in arrays:
+                specs.append(None if a is None else [a.dtype.str, list(a.shape), offset])
+                offset += 0 if a is None else a.nbytes + -a.nbytes % 64
+            
+            tail = [[list(k), [x.tolist() if isinstance(x, np.ndarray) else x for x in v] if v else None]
+                    for k, v in null.tail.items()]
+            head = json.dumps({'key': key, 'method': null.method, 'n_sim': int(null.n_sim), 'tail': tail,
+                               'arrays': specs}).encode('utf-8')
+            data = end + __RECORD.size + len(head)
+            
+            f.seek(end)
+            f.write(__RECORD.pack(b'PHRC', 0, len(head)) + head + b'\0' * (-data % 64))
+            
+            for a in arrays:
+                if a is not None:
+                    f.write(a.tobytes() + b'\0' * (-a.nbytes % 64))
+            
+            f.write(__RECORD_END)
+            length = f.tell() - end
+            f.flush()
+            os.fsync(f.fileno())
+            
+            f.seek(end + 4)
+            f.write(struct.pack('<Q', length))
+            f.flush()
+            os.fsync(f.fileno())
+            __store_scan(path, state, f)
+        finally:
+            __unlock(f)
+
+
+# Null distributions of several tests, served from the cache when the simulation is seeded
+def __null_distributions(tests, n, sim, random_state = None, method = 'mc'):
+    if method not in __methods and not (isinstance(method, tuple) and method[0] == 'ar1'):
+        raise ValueError('Unknown p-value method: {}'.format(method))
+    
+    keys = dict((test, __random_generator(random_state, n, test)[1]) for test in tests)
+    missing = [test for test in tests if keys[test] is None or (test, n, sim, method, keys[test]) not in __null_cache]
+    store = __options['null_store']
+    
+    if store:
+        for test in [test for test in missing if keys[test] is not None]:
+            null = __store_get(store, (test, n, sim, method, keys[test]))
+            
+            if null is not None:
+                __null_cache[(test, n, sim, method, keys[test])] = null
+                missing.remove(test)
+    
+    if missing and __options['common_random_numbers']:
+        res = __simulate_nulls(missing, n, sim, random_state, method)
+    else:
+        res = dict((test, __simulate_nulls([test], n, sim, random_state, method)[test]) for test in missing)
+    
+    for test in tests:
+        if keys[test] is not None:
+            if test in res and __options['cache']:
+                if __options['compact_cache']:
+                    res[test] = __compact_null(res[test])
+                
+                __null_cache[(test, n, sim, method, keys[test])] = res[test]
+                
+                if store:
+                    __store_put(store, (test, n, sim, method, keys[test]), res[test])
+            
+            res.setdefault(test, __null_cache.get((test, n, sim, method, keys[test])))
+    
+    return res
+
+
+def __null_distribution(test, n, sim, random_state = None, method = 'mc'):
+    return __null_distributions([test], n, sim, random_state, method)[test]
+
+
+# True if the null distribution of a seeded simulation can be read without simulating it
+def __null_available(test, n, sim, random_state, method):
+    key = __random_generator(random_state, n, test)[1]
+    
+    if key is None or method not in __methods:
+        return False
+    
+    if (test, n, sim, method, key) in __null_cache:
+        return True
+    
+    return bool(__options['null_store']) and __store_get(__options['null_store'], (test, n, sim, method, key)) is not None
+
+
+# Statistics of the length n prefixes of a block from its running sums C and sums of squares Q
+# (Pettitt's statistic is kept up to date by the sweep itself)
+def __prefix_stat(test, C, Q, n):
+    k = np.arange(1, n + 1)
+    S = C[:, :n] - np.outer(C[:, n - 1] / n, k)
+    ss = Q[:, n - 1] - C[:, n - 1] ** 2 / n
+    S[:, -1] = 0
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if test == 'snht':
+            return (S[:, :-1] ** 2 * n / (k[:-1] * (n - k[:-1]))).max(axis=1) / (ss / (n - 1))
+        
+        if test == 'variance_lr':
+            m = C[:, n - 1:n] / n
+            Qd = Q[:, :n] - 2 * m * C[:, :n] + k * m ** 2
+            
+            return __variance_lr_profile(Qd, ss[:, None], k, n).max(axis=1)
+        
+        sd = np.sqrt(ss / n)
+        
+        if test == 'buishand_q':
+            return abs(S).max(axis=1) / sd / np.sqrt(n)
+        
+        if test == 'buishand_range':
+            return (S.max(axis=1) - S.min(axis=1)) / sd / np.sqrt(n)
+        
+        if test == 'buishand_likelihood_ratio':
+            return (abs(S[:, :-1]) / np.sqrt(k[:-1] * (n - k[:-1]))).max(axis=1) / sd
+        
+        return (S[:, :-1] ** 2).sum(axis=1) / sd ** 2 / (n * (n + 1))
+
+
+# Null distributions of every length n_min..n_max from one simulated (sim, n_max) matrix: the
+# running sums are shared by all prefixes and Pettitt's U_k grows by sum_{i<=k} sign(x_i - x_n)
+# with each new value. The sweep is still O(n_max^2) per series (every prefix is scanned), some
+# 20-40 times one simulation of n_max, but several times faster than simulating each length apart
+def __sweep_nulls(tests, n_min, n_max, sim, random_state = None):
+    rng = __random_generator(random_state, n_max, tests[0])[0]
+    stat = dict(((test, n), []) for test in tests for n in range(n_min, n_max + 1))
+    
+    for r, rand_data in __draws('mc', rng, n_max, sim):
+        x = rand_data.astype(float)
+        C = x.cumsum(axis=1)
+        Q = (x ** 2).cumsum(axis=1)
+        U = np.zeros((len(x), n_max)) if 'pettitt' in tests else None
+        
+        for n in range(2, n_max + 1):
+            if U is not None:
+                U[:, :n - 1] += np.sign(x[:, :n - 1] - x[:, n - 1:n]).cumsum(axis=1)
+            
+            if n < n_min:
+                continue
+            
+            for test in tests:
+                if test == 'pettitt':
+                    stat[(test, n)].append(abs(U[:, :n - 1]).max(axis=1))
+                else:
+                    stat[(test, n)].append(__prefix_stat(test, C, Q, n))
+    
+    return dict((key, np.sort(np.concatenate(v))) for key, v in stat.items())
+
+
+# Generalized Pareto model of the exceedances over the upper tail_fraction quantile of the
+# null: (threshold, exceedance rate, shape, scale, covariance of (shape, scale), variance of
+# the log rate), or None when there are too few exceedances to fit. A compacted null keeps
+# the fit made before compaction.
+def __gpd_tail(null):
+    key = ('gpd', __options['tail_fraction'])
+    
+    if null.method == 'sketch':
+        return null.tail.get(key, next((v for k, v in null.tail.items() if k[0] == 'gpd'), None))
+    
+    if key not in null.tail:
+        t = np.sort(null.stat.ravel())
+        k = int(len(t) * __options['tail_fraction'])
+        
+        if k < 50:
+            null.tail[key] = None
+        else:
+            u = t[-k - 1]
+            xi, loc, sigma = genpareto.fit(t[-k:] - u, floc=0)
+            # asymptotic covariance of the maximum likelihood estimates (Smith, 1987)
+            cov = (1 + xi) / k * np.array([[1 + xi, -sigma], [-sigma, 2 * sigma ** 2]])
+            null.tail[key] = (u, k / len(t), xi, sigma, cov, (1 - k / len(t)) / k)
+    
+    return null.tail[key]
+
+
+# Extrapolated p-values (and standard errors) of the statistics beyond the tail threshold
+def __gpd_p_value(null, stat, p, se):
+    fit = __gpd_tail(null)
+    
+    if fit is None:
+        return p, se
+    
+    u, rate, xi, sigma, cov, rate_var = fit
+    beyond = stat > u
+    
+    if not beyond.any():
+        return p, se
+    
+    z = stat[beyond] - u
+    log_p = np.log(rate) + genpareto.logsf(z, xi, scale=sigma)
+    
+    # delta method on log p, with the binomial variance of the exceedance rate
+    # (beyond the endpoint of a bounded tail p is 0 and so is its standard error)
+    h = 1e-6 * np.array([1, sigma])
+    
+    with np.errstate(invalid='ignore'):
+        grad = [(genpareto.logsf(z, xi + h[0], scale=sigma) - genpareto.logsf(z, xi - h[0], scale=sigma)) / (2 * h[0]),
+                (genpareto.logsf(z, xi, scale=sigma + h[1]) - genpareto.logsf(z, xi, scale=sigma - h[1])) / (2 * h[1])]
+    
+    grad = np.nan_to_num(np.array(grad))
+    var = np.einsum('i...,ij,j...->...', grad, cov, grad) + rate_var
+    
+    p, se = np.array(p, dtype=float), np.array(se, dtype=float)
+    p[beyond] = np.exp(log_p)
+    se[beyond] = np.nan_to_num(p[beyond] * np.sqrt(var))
+    
+    return p, se
+
+
+# Compacted null: the statistics at the tail counts t = 0, 1, 2, ... growing by a factor
+# (1 + sketch_error) once they exceed 1 / sketch_error, with their p-values and standard
+# errors. A p-value looked up at the nearest grid point below stat is exact on the grid and
+# between grid points overestimates the full null's p-value by a relative error of at most
+# sketch_error (exactly so for 'mc', up to the smoothing of the estimator for 'qmc' and
+# 'control'). Lookups stay a binary search over about 1 / e + log(e sim) / e points.
+def __compact_null(null):
+    eps = __options['sketch_error']
+    
+    if null.method == 'sketch':
+        return null
+    
+    t = np.sort(null.stat.ravel())
+    counts = [0]
+    
+    while counts[-1] < len(t) - 1:
+        counts.append(min(max(counts[-1] + 1, int(counts[-1] * (1 + eps))), len(t) - 1))
+    
+    if __options['tail'] == 'gpd':
+        __gpd_tail(null)
+    
+    stat = np.r_[-np.inf, np.unique(t[len(t) - 1 - np.array(counts)])]
+    p, se = __empirical_p_value(null, stat)[:2]
+    p[0], se[0] = 1.0, 0.0
+    
+    return __Null('sketch', stat, np.array([p, se], dtype=np.float32), dict(null.tail), null.n_sim)
+
+
+# p-value, its standard error and the No. of simulations behind it
+def __p_value(null, stat):
+    stat = np.asarray(stat)
+    p, se, sim = __empirical_p_value(null, stat)
+    
+    if __options['tail'] == 'gpd':
+        p, se = __gpd_p_value(null, np.atleast_1d(stat), np.atleast_1d(p), np.atleast_1d(se))
+        p, se = p.reshape(stat.shape), se.reshape(stat.shape)
+    
+    # no p-value for a nan statistics (as in the batch results)
+    if np.isnan(stat).any():
+        p, se = np.where(np.isnan(stat), np.nan, p), np.where(np.isnan(stat), np.nan, se)
+    
+    return p, se, sim
+
+
+def __empirical_p_value(null, stat):
+    if null.method == 'sketch':
+        # the grid point at or below stat: exact there and conservative in between
+        i = np.searchsorted(null.stat, stat, side='right') - 1
+        
+        return null.control[0][i].astype(float), null.control[1][i].astype(float), null.n_sim
+    
+    if null.method == 'qmc':
+        reps, size = null.stat.shape
+        p_rep = np.array([size - np.searchsorted(row, stat, side='right') for row in null.stat]) / size
+        
+        return p_rep.mean(axis=0), p_rep.std(axis=0, ddof=1) / np.sqrt(reps), reps * size
+    
+    sim = len(null.stat)
+    tail = sim - np.searchsorted(null.stat, stat, side='right')
+    p = tail / sim
+    
+    if null.method == 'mc':
+        return p, np.sqrt(p * (1 - p) / sim), sim
+    
+    # control variate with known mean 1: p = mean(Y) - beta * (mean(C) - 1)
+    c_sum, c2_sum = null.control[:, 0]
+    c_mean = c_sum / sim
+    var_c = (c2_sum - sim * c_mean ** 2) / (sim - 1)
+    cov = (null.control[0, sim - tail] - sim * p * c_mean) / (sim - 1)
+    var_y = p * (1 - p) * sim / (sim - 1)
+    beta = cov / var_c
+    
+    p_cv = np.clip(p - beta * (c_mean - 1), 0, 1)
+    se = np.sqrt(np.maximum(var_y - cov * beta, 0) / sim)
+    
+    return p_cv, se, sim
+
+
+# Importance sampling works on u, the centered and normalized series, which is uniform on the
+# unit sphere of the (n - 1) dimensional centered subspace under the iid normal null and
+# determines every statistics. With step directions e = v / |v|, v = 1{j < i <= j + L} - L / n,
+# SNHT, Buishand's likelihood ratio, Q and range exceed stat exactly when |<u, e>| > c for
+# some step, so the tail is a union of spherical caps with known probabilities.
+# Caps are indexed by the step length L = 1..n-1 (range also uses every start j).
+def __tail_caps(test, stat, n):
+    L = np.arange(1, n)
+    norm = np.sqrt(L * (n - L) / n)
+    count = np.ones(n - 1)
+    
+    if test == 'snht':
+        c = np.full(n - 1, np.sqrt(stat / (n - 1)))
+    elif test == 'buishand_likelihood_ratio':
+        c = np.full(n - 1, float(stat))
+    elif test == 'buishand_q':
+        c = stat / norm
+    elif test == 'buishand_range':
+        c = stat / norm
+        count = n - L + 1.
+    else:
+        # Pettitt: caps of the rank based threshold, only approximately covering the tail
+        c = stat / (2 * np.sqrt(n * (n**2 - 1) / 12) * norm)
+    
+    return c, count, beta_dist.sf(np.minimum(c, 1) ** 2, 0.5, (n - 2) / 2)
+
+
+# No. of caps holding each row of u
+def __cap_count(test, u, c, stat):
+    S = u.cumsum(axis=1)
+    n = u.shape[1]
+    
+    if test != 'buishand_range':
+        L = np.arange(1, n)
+        
+        return (abs(S[:, :-1]) / np.sqrt(L * (n - L) / n) > c).sum(axis=1)
+    
+    # pairs of partial sums (S_0 = S_n = 0) more than stat apart
+    S = np.sort(np.c_[np.zeros(len(S)), S[:, :-1], np.zeros(len(S))], axis=1)
+    
+    return np.array([(len(row) - np.searchsorted(row, row + stat, side='right')).sum() for row in S])
+
+
+# Draws of u from the cap mixture (cap chosen with probability prop. to its probability,
+# then uniformly inside it), with probability `null` from the whole sphere instead
+def __cap_draws(rng, size, n, c, count, P, null = 0.0):
+    g = rng.standard_normal((size, n))
+    g -= g.mean(axis=1, keepdims=True)
+    
+    w = count * P
+    L = rng.choice(n - 1, size, p=w / w.sum()) + 1
+    j = (rng.random(size) * (n - L + 1) * (count[L - 1] > 1)).astype(int)
+    i = np.arange(n)
+    e = ((i >= j[:, None]) & (i < (j + L)[:, None])) - (L / n)[:, None]
+    e /= np.linalg.norm(e, axis=1, keepdims=True)
+    
+    t = np.sqrt(beta_dist.isf(rng.random(size) * P[L - 1], 0.5, (n - 2) / 2)) * rng.choice([-1.0, 1.0], size)
+    g -= (g * e).sum(axis=1, keepdims=True) * e
+    g /= np.linalg.norm(g, axis=1, keepdims=True)
+    
+    u = t[:, None] * e + np.sqrt(1 - t ** 2)[:, None] * g
+    whole = rng.random(size) < null
+    
+    if whole.any():
+        v = rng.standard_normal((whole.sum(), n))
+        v -= v.mean(axis=1, keepdims=True)
+        u[whole] = v / np.linalg.norm(v, axis=1, keepdims=True)
+    
+    return u
+
+
+# Weighted tail indicators of draws from an equal mixture of the cap mixtures shrunk by `scales`
+def __cap_weights(test, stat, n, size, rng, scales = (1.0,), null = 0.0):
+    c0, count, P = __tail_caps(test, stat, n)
+    caps = []
+    
+    for f in scales:
+        c = c0 * f
+        P = beta_dist.sf(np.minimum(c, 1) ** 2, 0.5, (n - 2) / 2)
+        
+        if (count * P).sum() > 0:
+            caps.append((c, P, (count * P).sum()))
+    
+    if not caps:
+        return np.zeros(size)
+    
+    which = rng.integers(len(caps), size=size)
+    u = np.empty((size, n))
+    
+    for i, (c, P, total) in enumerate(caps):
+        u[which == i] = __cap_draws(rng, (which == i).sum(), n, c, count, P, null)
+    
+    stat_r = stat if test == 'buishand_range' else None
+    N = np.mean([__cap_count(test, u, c, stat_r) / total for c, P, total in caps], axis=0)
+    w = 1 / (null + (1 - null) * N)
+    
+    return w * (__batch_stat(test, u, __dense_layout(size, n))[0] > stat)
+
+
+# Eigenvalues of the Buishand U quadratic form sum_k S_k**2 on the centered subspace
+def __u_eigenvalues(n):
+    k = np.arange(1, n)
+    V = (np.arange(n) < k[:, None]) - (k / n)[:, None]
+    
+    return np.linalg.eigvalsh(V.T @ V)[1:]
+
+
+# Importance sampling p-value of one statistics (for p-values far below 1 / sim)
+def __importance_p_value(test, stat, n, sim, rng, chunk = 2**20):
+    rows = max(1, chunk // (4 * n))
+    
+    if test == 'buishand_u':
+        # U > stat iff sum (lam - (n + 1) stat) g**2 > 0 for iid normal g: exponential tilting
+        # of that quadratic form at the saddlepoint where its tilted mean is zero
+        b = __u_eigenvalues(n) - (n + 1) * stat
+        
+        if b.max() <= 0:
+            return 0.0, 0.0
+        
+        theta = 0.0
+        
+        if b.sum() < 0:
+            theta = brentq(lambda a: (b / (1 - 2 * a * b)).sum(), 0, (1 - 1e-12) / (2 * b.max()))
+        
+        scale = 1 / np.sqrt(1 - 2 * theta * b)
+        log_m = np.log(scale).sum()
+        wy = []
+        
+        for i in range(0, sim, rows):
+            g = rng.standard_normal((min(rows, sim - i), n - 1)) * scale
+            Q = (b * g ** 2).sum(axis=1)
+            wy.append(np.exp(log_m - theta * Q) * (Q > 0))
+        
+    elif test == 'pettitt':
+        # the rank tail is only roughly covered by the caps, so mix several enlarged ones and
+        # draws from the whole sphere to keep the estimate unbiased where it reaches outside
+        wy = [__cap_weights(test, stat, n, min(rows, sim - i), rng, (1.0, 0.9, 0.8, 0.7), 0.1)
+              for i in range(0, sim, rows)]
+        
+    else:
+        wy = [__cap_weights(test, stat, n, min(rows, sim - i), rng) for i in range(0, sim, rows)]
+    
+    wy = np.concatenate(wy)
+    
+    return min(wy.mean(), 1), wy.std(ddof=1) / np.sqrt(sim)
+
+
+# Simulated p-values, standard errors and No. of simulations of one or more statistics
+def __p_values(test, stat, n, sim, random_state = None, method = 'mc'):
+    if method != 'importance':
+        return __p_value(__null_distribution(test, n, sim, random_state, method), stat)
+    
+    if test in __two_break + ('variance_lr',):
+        raise ValueError('importance p-values are not available for the {} test.'.format(test))
+    
+    rng = __random_generator(random_state, n, test)[0]
+    
+    if rng is None:
+        rng = np.random.default_rng(np.random.randint(2**31, size=4))
+    
+    stat = np.asarray(stat, dtype=float)
+    res = np.array([__importance_p_value(test, t, n, sim, rng) for t in stat.ravel()]).reshape(stat.shape + (2,))
+    
+    return res[..., 0], res[..., 1], sim
+
+
+# Optimal block length of the stationary ('stationary') or circular moving ('moving') block
+# bootstrap of every row of e (Politis and White, 2004, with the correction of Patton,
+# Politis and White, 2009), rounded and kept between 1 and min(3 sqrt(n), n / 3)
+def __block_length(e, kind = 'stationary'):
+    m, n = e.shape
+    e = e - e.mean(axis=1, keepdims=True)
+    kn = max(5, int(np.log10(n)))
+    m_max = min(int(np.ceil(np.sqrt(n))) + kn, n - 1)
+    lag = np.arange(m_max + 1)
+    
+    acv = np.array([(e[:, i:] * e[:, :n - i]).sum(axis=1) for i in lag]).T / n
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        acf = abs(acv) / acv[:, :1]
+    
+    # M = 2 m where m is the first lag followed by kn insignificant autocorrelations
+    small = np.c_[acf[:, 1:] < 2 * np.sqrt(np.log10(n) / n), np.zeros((m, kn), bool)]
+    run = np.array([small[:, i:i + kn].all(axis=1) for i in range(m_max)]).T
+    first = np.where(run.any(axis=1), run.argmax(axis=1), m_max)
+    M = np.minimum(2 * np.maximum(first, 1), m_max)
+    
+    t = lag / np.maximum(M, 1)[:, None]
+    lam = np.where(t <= 0.5, 1, np.clip(2 * (1 - t), 0, None)) * (lag <= M[:, None])
+    g = 2 * (lam * lag * acv)[:, 1:].sum(axis=1)
+    lr = acv[:, 0] + 2 * (lam * acv)[:, 1:].sum(axis=1)
+    d = (2 if kind == 'stationary' else 4 / 3) * lr ** 2
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        b = (2 * g ** 2 / d) ** (1 / 3) * n ** (1 / 3)
+    
+    return np.clip(np.nan_to_num(np.round(b)), 1, max(1, np.ceil(min(3 * np.sqrt(n), n / 3)))).astype(int)
+
+
+# (size, n) permutation or (m, size, n) block bootstrap index matrices of m series of length n
+# built by index arithmetic; block is the block length of each series
+def __resample_index(method, rng, size, n, block):
+    if method == 'permutation':
+        return rng.random((size, n)).argsort(axis=1)
+    
+    t = np.arange(n)
+    b = block[:, None, None]
+    
+    if __options['bootstrap'] == 'moving':
+        # circular blocks of length b (rounded to an integer) starting at uniform positions
+        block = np.maximum(np.round(block), 1).astype(int)
+        b = block[:, None, None]
+        start = (rng.random((size, n)) * n).astype(int)
+        
+        return (start[:, t // block[:, None]].transpose(1, 0, 2) + t % b) % n
+    
+    # stationary bootstrap: a new block (uniform start) begins with probability 1 / b
+    new = rng.random((size, n)) < 1 / b
+    new[..., 0] = True
+    last = np.maximum.accumulate(np.where(new, t, 0), axis=-1)
+    start = np.broadcast_to((rng.random((size, n)) * n).astype(int), last.shape)
+    
+    return (np.take_along_axis(start, last, -1) + t - last) % n
+
+
+# Resampling p-values of m observed series of length n (rows of X): permutations or block
+# bootstrap samples of the series. The bootstrap resamples the series itself rather than the
+# residuals around the fitted shift, whose bootstrap nulls are too narrow for autocorrelated
+# data (about 20 % rejections at alpha = 0.05 for AR(1), phi = 0.6, n = 100). Every chunk resamples all series together,
+# with index matrices from __resample_index, and has its own seed, so the result does not
+# depend on the No. of threads running the chunks.
+def __resample_p_values(test, X, stat, sim, rng, method = 'permutation', chunk = 2**20):
+    m, n = X.shape
+    rows = max(1, chunk // (m * n))
+    sizes = [min(rows, sim - i) for i in range(0, sim, rows)]
+    seeds = (rng.integers if rng is not None else np.random.randint)(2**31, size=(len(sizes), 4))
+    level = stat[:, None] - 1e-9 * abs(stat[:, None])
+    block = None
+    
+    if method == 'block_bootstrap':
+        block = np.full(m, __options['block_length']) if __options['block_length'] else __block_length(X, __options['bootstrap'])
+    
+    # ranks are permuted along with the values, so Pettitt's ranks are computed only once
+    R = rankdata(X, axis=1) - (n + 1) / 2 if test == 'pettitt' and method == 'permutation' else None
+    
+    def count(args):
+        seed, size = args
+        idx = __resample_index(method, np.random.default_rng(seed), size, n, block)
+        
+        if R is not None:
+            T = abs(2 * R[:, idx].cumsum(axis=2)[..., :-1]).max(axis=2)
+        else:
+            Xs = X[:, idx] if idx.ndim == 2 else np.take_along_axis(X[:, None, :], idx, 2)
+            T = __batch_stat(test, Xs.reshape(-1, n), __dense_layout(m * size, n))[0].reshape(m, size)
+        
+        return (T >= level).sum(axis=1)
+    
+    if __options['threads'] > 1 and len(sizes) > 1:
+        with ThreadPoolExecutor(__options['threads']) as pool:
+            counts = sum(pool.map(count, zip(seeds, sizes)))
+    else:
+        counts = sum(map(count, zip(seeds, sizes)))
+    
+    # the observed order is one of the permutations
+    p = (counts + 1) / (sim + 1) if method == 'permutation' else counts / sim
+    
+    return p, np.sqrt(p * (1 - p) / sim)
+
+
+# Lag-1 autocorrelation of the residuals around the means before and after the change-point of
+# every series of a batch, with the bias correction (1 + 3 phi) / n of Kendall (1954)
+def __batch_lag1(x, layout, loc, mu1, mu2):
+    e = x - np.where(layout.k <= __expand(layout, loc), __expand(layout, mu1), __expand(layout, mu2))
+    
+    if layout.width:
+        num = (e[:, 1:] * e[:, :-1]).sum(axis=1)
+    else:
+        same = layout.seg[1:] == layout.seg[:-1]
+        num = np.bincount(layout.seg[1:][same], (e[1:] * e[:-1])[same], minlength=len(layout.n))
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        phi = num / __reduce(layout, np.add, e ** 2)
+    
+    return np.clip(np.nan_to_num(phi + (1 + 3 * phi) / layout.n), *__ar1_range)
+
+
+# p-values against AR(1) nulls: the nulls at the two grid points around each phi are simulated
+# (or read from the cache) and the p-values and standard errors interpolated linearly in phi
+def __ar1_p_values(test, stat, n, sim, random_state, phi):
+    step = __options['ar1_step']
+    grid = (np.asarray(phi, dtype=float) - __ar1_range[0]) / step
+    lo = np.floor(grid).astype(int)
+    w = grid - lo
+    p = np.zeros((2,) + grid.shape)
+    
+    for g in np.unique(np.r_[lo, lo + 1]):
+        i = (lo == g) | (lo + 1 == g)
+        
+        if not (i & (np.where(lo == g, 1 - w, w) > 0)).any():
+            continue
+        
+        phi_g = round(min(__ar1_range[0] + g * step, __ar1_range[1]), 10)
+        null = __null_distribution(test, n, sim, random_state, ('ar1', phi_g) if phi_g else 'mc')
+        p[:, i] += np.array(__p_value(null, stat[i])[:2]) * np.where(lo[i] == g, 1 - w[i], w[i])
+    
+    return p[0], p[1]
+
+
+# Asymptotic p-values of the partial sum tests, from the limiting functionals of the Brownian
+# bridge B: sup |B| (Kolmogorov) for Q, its range (Kuiper) for R and the integral of B^2 (Cramer-von
+# Mises, Anderson and Darling 1952) for U. The maximum of the standardized partial sums, sqrt(T) for
+# SNHT and sqrt(n) V for the likelihood ratio, uses Siegmund's (1988) tail approximation with the
+# discrete overshoot correction nu, integrated over u = log(t / (1 - t)) between 1 / n and 1 - 1 / n
+def __asymptotic_p_value(test, stat, n):
+    stat = np.asarray(stat, dtype=float)
+    
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        if test == 'buishand_q':
+            p = kstwobign.sf(stat)
+            
+        elif test == 'buishand_range':
+            k = np.arange(1, 101)[:, None]
+            v = stat.ravel()[None, :] ** 2
+            p = 2 * ((4 * k**2 * v - 1) * np.exp(-2 * k**2 * v)).sum(axis=0).reshape(stat.shape)
+            p = np.where(stat < 0.4, 1, p)
+            
+        elif test == 'buishand_u':
+            k = np.arange(20)[:, None]
+            y = 4 * k + 1
+            q = y**2 / (16 * stat.ravel()[None, :])
+            cdf = np.exp(gammaln(k + 0.5) - gammaln(k + 1)) / (np.pi**1.5 * np.sqrt(stat.ravel())) * np.sqrt(y) * np.exp(-q) * kv(0.25, q)
+            p = 1 - np.nan_to_num(cdf).sum(axis=0).reshape(stat.shape)
+            
+        elif test in ('snht', 'buishand_likelihood_ratio'):
+            z = (np.sqrt(stat) if test == 'snht' else np.sqrt(n) * stat).ravel()[:, None]
+            u = np.linspace(-1, 1, 401) * np.log(n - 1)
+            x = np.maximum(z * (1 + np.exp(u)) / np.exp(u / 2) / np.sqrt(n), 1e-12) / 2
+            nu = (ndtr(x) - 0.5) / x / (x * ndtr(x) + np.exp(-x**2 / 2) / np.sqrt(2 * np.pi))
+            p = z[:, 0] * np.exp(-z[:, 0]**2 / 2) / np.sqrt(2 * np.pi) * (nu.sum(axis=1) - (nu[:, 0] + nu[:, -1]) / 2) * (u[1] - u[0])
+            # the tail approximation only holds above the bulk of the distribution
+            p = np.where(np.isnan(p) | (z[:, 0] <= 1), 1, p).reshape(stat.shape)
+            
+        else:
+            raise ValueError('No asymptotic null for the {} test.'.format(test))
+    
+    return np.clip(p, 0, 1)
+
+
+# Chunks of a long series: slices of an array like (numpy array, np.memmap, h5py or zarr
+# dataset), the chunks of a fresh iterable from a callable, or of a re-iterable
+def __stream_chunks(x, chunk):
+    if hasattr(x, 'shape'):
+        for i in range(0, len(x), chunk):
+            yield np.asarray(x[i:i + chunk], dtype=float).ravel()
+        
+        return
+    
+    it = iter(x() if callable(x) else x)
+    
+    if it is x:
+        raise ValueError('A one-shot iterator can not be read twice, pass a callable returning a fresh one.')
+    
+    for c in it:
+        yield np.asarray(c, dtype=float).ravel()
+
+
+# Two streaming passes with O(chunk) memory: No. of values, mean and sum of squared deviations
+# (merged chunk by chunk, Chan et al. 1979), then the partial sums, test statistics and its location
+def __stream_stat(test, x, chunk):
+    n, mean, ss = 0, 0.0, 0.0
+    
+    for c in __stream_chunks(x, chunk):
+        c = c[~np.isnan(c)]
+        
+        if len(c):
+            m = c.mean()
+            d = m - mean
+            n += len(c)
+            mean += d * len(c) / n
+            ss += ((c - m)**2).sum() + d**2 * len(c) * (n - len(c)) / n
+    
+    if n < 2:
+        raise ValueError('At least 2 valid values are needed.')
+    
+    best, loc, cp, S_loc = -np.inf, 0, 0, 0.0
+    S0, k0, r0, hi, lo, total = 0.0, 0, 0, -np.inf, np.inf, 0.0
+    
+    for c in __stream_chunks(x, chunk):
+        valid = np.flatnonzero(~np.isnan(c))
+        S = S0 + np.cumsum(c[valid] - mean)
+        k = k0 + np.arange(1, len(valid) + 1)
+        inner = k < n
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if test == 'snht':
+                crit = np.where(inner, S**2 * n / (k * (n - k)) / (ss / (n - 1)), -np.inf)
+            else:
+                crit = abs(S)
+                
+                if test == 'buishand_range' and len(S):
+                    hi, lo = max(hi, S.max()), min(lo, S.min())
+                    
+                elif test == 'buishand_likelihood_ratio':
+                    total = max(total, np.where(inner, abs(S) / np.sqrt(k * (n - k)), -np.inf).max(initial=-np.inf))
+                    
+                elif test == 'buishand_u':
+                    total += (S[inner]**2).sum()
+        
+        if len(S) and crit.max() > best:
+            i = crit.argmax()
+            best, loc, cp, S_loc = crit[i], k[i], r0 + valid[i] + 1, S[i]
+        
+        S0, k0, r0 = S[-1] if len(S) else S0, k0 + len(valid), r0 + len(c)
+    
+    sd = np.sqrt(ss / n)
+    
+    if test == 'snht':
+        stat = best
+    elif test == 'buishand_q':
+        stat = best / sd / np.sqrt(n)
+    elif test == 'buishand_range':
+        stat = (hi - lo) / sd / np.sqrt(n)
+    elif test == 'buishand_likelihood_ratio':
+        stat = total / sd
+    else:
+        stat = total / sd**2 / (n * (n + 1))
+    
+    mu = namedtuple('mean', ['mu1', 'mu2'])
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg = mu(mean + S_loc / loc, mean - S_loc / (n - loc) if loc < n else np.nan)
+    
+    return stat, cp, n, avg
+
+
+# Mergeable quantile summary of a stream: sorted values v with weights w, whose cumulative weight
+# up to x is at most slack below the No. of data values <= x (and < x). A summary is compacted to
+# the points at every N / m-th cumulative weight, adding the largest weight dropped per group to slack
+__Summary = namedtuple('summary', ['v', 'w', 'slack'])
+
+
+def __summary_compact(v, w, slack, m):
+    C = np.cumsum(w)
+    
+    if len(v) <= m:
+        return __Summary(v, w, slack)
+    
+    i = np.unique(np.searchsorted(C, np.arange(1, m + 1) * (C[-1] / m)).clip(max=len(v) - 1))
+    i[-1] = len(v) - 1
+    W = np.diff(np.r_[0, C[i]])
+    
+    return __Summary(v[i], W, slack + (W - w[i]).max())
+
+
+def __summary_merge(a, b, m = None):
+    v = np.r_[a.v, b.v]
+    order = np.argsort(v, kind='stable')
+    v, w, slack = v[order], np.r_[a.w, b.w][order], a.slack + b.slack
+    
+    return __summary_compact(v, w, slack, m) if m else __Summary(v, w, slack)
+
+
+# Quantile sketch of a stream of chunks: every chunk is sorted and compacted to m points in parallel
+# threads, and the chunk summaries are merged like a binary counter (two summaries of the same level
+# are merged and compacted into one of the next level), so memory stays O(m log(No. of chunks))
+def __stream_sketch(x, chunk, m):
+    levels = []
+    chunks = __stream_chunks(x, chunk)
+    
+    def summarize(c):
+        v = np.sort(c[~np.isnan(c)])
+        
+        return __summary_compact(v, np.ones(len(v), dtype=np.int64), 0, m)
+    
+    with ThreadPoolExecutor(max(__options['threads'], 1)) as pool:
+        while True:
+            batch = [c for _, c in zip(range(max(__options['threads'], 1)), chunks)]
+            
+            if not batch:
+                break
+            
+            for s in pool.map(summarize, batch):
+                l = 0
+                
+                while l < len(levels) and levels[l] is not None:
+                    s = __summary_merge(levels[l], s, m)
+                    levels[l] = None
+                    l += 1
+                
+                if l == len(levels):
+                    levels.append(None)
+                
+                levels[l] = s
+    
+    res = __Summary(np.empty(0), np.empty(0, dtype=np.int64), 0)
+    
+    for s in levels:
+        if s is not None:
+            res = __summary_merge(res, s)
+    
+    return res
+
+
+# Monte carlo simulation for p-value calculation
+def __mc_p_value(test, stat, n, sim, random_state = None, method = 'mc'):
+    return __p_values(test, stat, n, sim, random_state, method)[0]
+
+
+# Mean calculation
+def __mean(x, loc):
+    mu = namedtuple('mean',['mu1', 'mu2'])
+    mu1 = x[:loc].mean()
+    mu2 = x[loc:].mean()
+    
+    return mu(mu1, mu2)
+
+
+# Standard deviation calculation
+def __sd(x, loc):
+    sd = namedtuple('sd', ['sd1', 'sd2'])
+    
+    return sd(x[:loc].std(ddof=1), x[loc:].std(ddof=1))
+
+
+# Homogeneity test
+def __test(res, test, x, alpha, sim, lazy = False, random_state = None, method = 'mc', deseasonalize = None):
+    x, c, idx = __preprocessing(x)
+    
+    if deseasonalize:
+        x = __batch_preprocessing(np.array(x, dtype=float)[None, :], season=__season_codes(idx, deseasonalize))[0]
+    
+    x, n, idx = __missing_values_analysis(x, idx, method = 'skip')
+    
+    if n < __min_length.get(test, 2):
+        res = LazyResult(res, [None, None, None, np.nan, None], None)
+        
+        return res if lazy else res.resolve()
+    
+    stat, loc = __tests[test](x)
+    
+    if test in __two_break:
+        cp, mu = (idx[loc[0]-1], idx[loc[1]-1]), __two_break_mean(test, x, loc)
+        loc = loc[0]
+    elif test == 'variance_lr':
+        cp, mu = idx[loc-1], __sd(x, loc)
+    else:
+        cp, mu = idx[loc-1], __mean(x, loc)
+    
+    if sim and (lazy or method in __resampling + ('ar1',)):
+        data = [x]
+        
+        if method == 'ar1' and test in __two_break:
+            data = __two_break_lag1(test, x)
+        elif method == 'ar1' and test == 'variance_lr':
+            data = __batch_lag1(x[None, :], __dense_layout(1, n), np.atleast_1d(loc), np.atleast_1d(x.mean()), np.atleast_1d(x.mean()))
+        elif method == 'ar1':
+            data = __batch_lag1(x[None, :], __dense_layout(1, n), np.atleast_1d(loc), np.atleast_1d(mu.mu1), np.atleast_1d(mu.mu2))
+        
+        pending = (test, np.atleast_1d(stat), np.atleast_1d(n), sim, alpha, random_state, method, data)
+        res = LazyResult(res, [None, cp, None, stat, mu], pending)
+        
+        return res if lazy else res.resolve()
+    
+    if sim:
+        p = __mc_p_value(test, stat, n, sim, random_state, method)
+        h = None if np.isnan(p) else alpha > p
+    elif test == 'pettitt':
+        p = 2 * np.exp((- 6 * stat**2) / (n**3 + n**2))
+        h = alpha > p
+    else:
+        p = None
+        h = None
+    
+    return res(h, cp, p, stat, mu)
+
+
+# Pending p-values of lazy results, one simulation per (sample size, sim, random state, method)
+# shared by all tests through common random numbers; permutation p-values permute all series
+# of the same length with the same index matrices
+def __resolve(results):
+    groups = {}
+    p = {}
+    
+    for r in results:
+        test, stat, n, sim, alpha, random_state, method, data = r.pending
+        p[id(r)] = np.full((2, len(stat)), np.nan)
+        
+        for size in np.unique(n[~np.isnan(stat)]):
+            key = (size, sim, random_state if not isinstance(random_state, np.random.Generator) else id(random_state), method)
+            groups.setdefault(key, []).append((r, (n == size) & ~np.isnan(stat)))
+    
+    for (size, sim, rs, method), members in groups.items():
+        random_state = members[0][0].pending[5]
+        
+        if method == 'importance':
+            for r, i in members:
+                p[id(r)][:, i] = __p_values(r.pending[0], r.pending[1][i], size, sim, random_state, method)[:2]
+            
+            continue
+        
+        if method == 'ar1':
+            for r, i in members:
+                p[id(r)][:, i] = __ar1_p_values(r.pending[0], r.pending[1][i], size, sim, random_state, r.pending[7][i])
+            
+            continue
+        
+        if method in __resampling:
+            for r, i in members:
+                X = np.array([r.pending[7][j] for j in np.flatnonzero(i)], dtype=float)
+                rng = __random_generator(random_state, size, r.pending[0])[0]
+                p[id(r)][:, i] = __resample_p_values(r.pending[0], X, r.pending[1][i], sim, rng, method)
+            
+            continue
+        
+        nulls = __null_distributions(sorted(set(r.pending[0] for r, i in members)), size, sim, random_state, method)
+        
+        for r, i in members:
+            p[id(r)][:, i] = __p_value(nulls[r.pending[0]], r.pending[1][i])[:2]
+    
+    for r in results:
+        r._fill(*p[id(r)])
+
+
+class LazyResult(object):
+    """
+    Result of a homogeneity test whose p-value (and h) is only computed, and cached, on first access.
+    It behaves like the named tuple returned by the test: fields can be read by name or unpacked,
+    reading cp, the test statistics or avg never triggers the monte carlo simulation.
+    Use resolve() on a list of lazy results to compute all their p-values together.
+    """
+    def __init__(self, res, values, pending):
+        self._res = res
+        self._values = values
+        self.pending = pending
+    
+    def _fill(self, p, se):
+        self._values[2] = p[0]
+        self._values[0] = None if np.isnan(p[0]) else self.pending[4] > p[0]
+        self.pending = None
+    
+    def resolve(self):
+        """Compute the p-value if needed and return the plain named tuple result."""
+        if self.pending is not None:
+            resolve([self])
+        
+        return self._res._make(self._values)
+    
+    def __getattr__(self, name):
+        res = self.__dict__.get('_res')
+        
+        if res is None or name not in res._fields:
+            raise AttributeError(name)
+        
+        return self[res._fields.index(name)]
+    
+    def __getitem__(self, i):
+        if i in (0, 2, -5, -3) or isinstance(i, slice):
+            return self.resolve()[i]
+        
+        return self._values[i]
+    
+    def __iter__(self):
+        return iter(self.resolve())
+    
+    def __len__(self):
+        return len(self._values)
+    
+    def __repr__(self):
+        if self.pending is None:
+            return repr(self.resolve())
+        
+        values = ['<lazy>' if i in (0, 2) else repr(v) for i, v in enumerate(self._values)]
+        
+        return '{}({})'.format(self._res.__name__, ', '.join('{}={}'.format(f, v) for f, v in zip(self._res._fields, values)))
+
+
+class BatchResult(object):
+    """
+    Columnar container of batch homogeneity test results, one entry per series.
+    Columns:
+        h: 1.0 (if data is nonhomogeneous), 0.0 (if data is homogeneous) or nan (if there is no p-value)
+        cp: probable change-point location
+        p: p-value of the significance test
+        p_se: estimated standard error of the simulated p-value
+        stat: test statistics of the selected test (named by stat_name)
+        mu1, mu2: mean values at before and after change-point
+        n_eff: No. of valid (non-missing) values used by the test
+        n_sim: No. of simulations behind the p-value (0 if none)
+    Columns are plain numpy arrays, available as attributes (res.p) or items (res['p']);
+    res[i] gives the i-th row (a slice or index array gives the columns of those rows).
+    to_pandas() and to_arrow() wrap the same buffers without copying.
+    A lazy result computes the p and h columns on first access (or on resolve()).
+    """
+    fields = ('h', 'cp', 'p', 'p_se', 'stat', 'mu1', 'mu2', 'n_eff', 'n_sim')
+    
+    def __init__(self, test, stat_name, columns, pending = None):
+        self.test = test
+        self.stat_name = stat_name
+        self.columns = columns
+        self.pending = pending
+    
+    def _fill(self, p, se):
+        self.columns['p'] = p
+        self.columns['p_se'] = se
+        self.columns['h'] = np.where(np.isnan(p), np.nan, self.pending[4] > p)
+        self.pending = None
+    
+    def resolve(self):
+        """Compute the pending p and h columns if needed and return the result itself."""
+        if self.pending is not None:
+            resolve([self])
+        
+        return self
+    
+    def __getattr__(self, name):
+        if name not in self.fields:
+            raise AttributeError(name)
+        
+        return self[name]
+    
+    def __getitem__(self, key):
+        # only the p, p_se and h columns are pending
+        if not isinstance(key, str) or key not in self.columns:
+            self.resolve()
+        
+        if isinstance(key, str):
+            return self.columns[key]
+        
+        row = namedtuple('Batch_Result', self.fields)
+        
+        return row(*[self.columns[f][key] for f in self.fields])
+    
+    def __len__(self):
+        return len(self.columns['stat'])
+    
+    def __repr__(self):
+        return 'BatchResult(test={!r}, series={})'.format(self.test, len(self))
+    
+    def to_records(self):
+        """Return the results as a numpy structured array (copies the columns)."""
+        self.resolve()
+        res = np.empty(len(self), dtype=[(f, self.columns[f].dtype) for f in self.fields])
+        
+        for f in self.fields:
+            res[f] = self.columns[f]
+        
+        return res
+    
+    def to_pandas(self):
+        """Return the results as a pandas DataFrame sharing the column buffers."""
+        import pandas as pd
+        
+        self.resolve()
+        
+        return pd.DataFrame({f: self.columns[f] for f in self.fields}, copy=False)
+    
+    def to_arrow(self):
+        """Return the results as a pyarrow Table (numeric columns are not copied)."""
+        import pyarrow as pa
+        
+        self.resolve()
+        
+        return pa.table([pa.array(self.columns[f]) for f in self.fields], names=list(self.fields))
+
+
+# Homogeneity test of a ragged batch (flat values split by offsets)
+def __ragged_test(test, values, offsets, alpha, sim, lazy = False, random_state = None, method = 'mc'):
+    m = len(offsets) - 1
+    seg = np.repeat(np.arange(m), np.diff(offsets))
+    pos = np.arange(len(values)) - offsets[:-1][seg] + 1
+    
+    # skip missing values and series too short to be tested
+    keep = ~np.isnan(values)
+    n = np.bincount(seg[keep], minlength=m)
+    valid = n >= 2
+    keep &= valid[seg]
+    
+    x = values[keep]
+    pos = pos[keep]
+    layout = __ragged_layout(np.r_[0, n[valid].cumsum()])
+    
+    # several tests share one pass of running sums and, through resolve, one simulation
+    tests = [test] if isinstance(test, str) else list(test)
+    pre = __batch_prefix(x, layout, 'variance_lr' in tests)
+    res = [__ragged_result(t, x, pos, n, valid, layout, pre, alpha, sim, random_state, method) for t in tests]
+    
+    if sim and not lazy:
+        resolve(res)
+    
+    return res[0] if isinstance(test, str) else dict(zip(tests, res))
+
+
+def __ragged_result(test, x, pos, n, valid, layout, pre, alpha, sim, random_state, method):
+    m = len(n)
+    stat, loc = __batch_stat(test, x, layout, pre)
+    mu1, mu2 = __batch_mean(x, layout, loc, pre)
+    
+    res = dict((f, np.full(m, np.nan)) for f in ['cp', 'p', 'stat', 'mu1', 'mu2'])
+    res['stat'][valid] = stat
+    res['cp'][valid] = pos[layout.starts + loc - 1]
+    res['mu1'][valid] = mu1
+    res['mu2'][valid] = mu2
+    res['p_se'] = np.full(m, np.nan)
+    res['n_eff'] = n
+    res['n_sim'] = np.where(valid, __n_sim(method, sim) if sim else 0, 0)
+    
+    if test == 'variance_lr':
+        res['mu1'][valid], res['mu2'][valid] = __batch_sd(x, layout, loc, mu1, mu2, pre)
+    
+    # series too short for the test are not tested
+    short = n < __min_length.get(test, 2)
+    
+    for f in ['cp', 'stat', 'mu1', 'mu2']:
+        res[f][short] = np.nan
+    
+    res['n_sim'][short] = 0
+    
+    if sim:
+        del res['p'], res['p_se']
+        data = [None] * m
+        
+        if method in __resampling:
+            for j, v in zip(np.flatnonzero(valid), np.split(x, layout.starts[1:])):
+                data[j] = v
+        
+        if method == 'ar1':
+            data = np.zeros(m)
+            
+            if test in __two_break:
+                data[valid] = np.concatenate([__two_break_lag1(test, v) for v in np.split(x, layout.starts[1:])])
+            elif test == 'variance_lr':
+                data[valid] = __batch_lag1(x, layout, loc, pre.mean, pre.mean)
+            else:
+                data[valid] = __batch_lag1(x, layout, loc, mu1, mu2)
+        
+        return BatchResult(test, __stat_names[test], res, (test, res['stat'], n, sim, alpha, random_state, method, data))
+    
+    if test == 'pettitt':
+        res['p'] = 2 * np.exp((- 6 * res['stat']**2) / (n.astype(float)**3 + n**2))
+    
+    # h is left undefined (nan) where there is no p-value, as h = None of the single tests
+    res['h'] = np.where(np.isnan(res['p']), np.nan, alpha > res['p'])
+    
+    return BatchResult(test, __stat_names[test], res)
+
+def pettitt_test(x, alpha = 0.05, sim = 20000, lazy = False, random_state = None, method = 'mc', deseasonalize = None):
+    """
+    This function checks homogeneity test using A. N. Pettitt's (1979) method.
+    Input:
+        x: a vector (list, numpy array or pandas series) data
+        alpha: significance level (default 0.05)
+        sim: No. of monte carlo simulation for p-value calculation (default 20000)
+        lazy: if True, p and h are only computed on first access (default False)
+        random_state: seed (int or SeedSequence) or numpy Generator of the monte carlo simulation
+                      (default None, uses numpy's global random state)
+        method: p-value simulation method, 'mc' (plain monte carlo), 'qmc' (randomized quasi-monte carlo),
+                'control' (monte carlo with control variates), 'importance' (importance sampling, for very
+                small p-values), 'permutation' (permutations of the observed series, for tied or non-normal
+                data), 'block_bootstrap' (block bootstrap of the series, for autocorrelated data) or 'ar1'
+                (AR(1) null with the estimated lag-1 autocorrelation, interpolated between cached nulls on a
+                grid of phi) (default 'mc')
+        deseasonalize: None (default), 'month' or 'dayofyear' to test the anomalies from the monthly or daily
+                       climatology, computed from the datetime index of x (Feb 29 shares the climatology
+                       of Feb 28, every season needs at least 2 valid values)
+    Output:
+        h: True (if data is nonhomogeneous) or False (if data is homogeneous)
+        cp: probable change-point location index
+        p: p-value of the significance test
+        U: Maximum of absolute Pettitt's U Statistics
+        avg: mean values at before and after change-point
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> x = np.random.rand(1000)
+      >>> h, cp, p, U, mu = hg.pettitt_test(x, 0.05)
+    """
+    res = namedtuple('Pettitt_Test', ['h', 'cp', 'p', 'U', 'avg'])
+    
+    return __test(res, 'pettitt', x, alpha, sim, lazy, random_state, method, deseasonalize)
+
+
+def snht_test(x, alpha = 0.05, sim = 20000, lazy = False, random_state = None, method = 'mc', deseasonalize = None):
+    """
+    This function checks homogeneity test using H. Alexandersson (1986) method.
+    Input:
+        x: a vector (list, numpy array or pandas series) data
+        alpha: significance level (default 0.05)
+        sim: No. of monte carlo simulation for p-value calculation (default 20000)
+        lazy: if True, p and h are only computed on first access (default False)
+        random_state: seed (int or SeedSequence) or numpy Generator of the monte carlo simulation
+                      (default None, uses numpy's global random state)
+        method: p-value simulation method, 'mc' (plain monte carlo), 'qmc' (randomized quasi-monte carlo),
+                'control' (monte carlo with control variates), 'importance' (importance sampling, for very
+                small p-values), 'permutation' (permutations of the observed series, for tied or non-normal
+                data), 'block_bootstrap' (block bootstrap of the series, for autocorrelated data) or 'ar1'
+                (AR(1) null with the estimated lag-1 autocorrelation, interpolated between cached nulls on a
+                grid of phi) (default 'mc')
+        deseasonalize: None (default), 'month' or 'dayofyear' to test the anomalies from the monthly or daily
+                       climatology, computed from the datetime index of x (Feb 29 shares the climatology
+                       of Feb 28, every season needs at least 2 valid values)
+    Output:
+        h: True (if data is nonhomogeneous) or False (if data is homogeneous)
+        cp: probable change-point location index
+        p: p-value of the significance test
+        T: Maximum of SNHT T Statistics
+        avg: mean values at before and after change-point
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> x = np.random.rand(1000)
+      >>> h, cp, p, T, mu = hg.snht_test(x, 0.05)
+    """
+    res = namedtuple('SNHT_Test', ['h', 'cp', 'p', 'T', 'avg'])
+
+    return __test(res, 'snht', x, alpha, sim, lazy, random_state, method, deseasonalize)
+
+
+def buishand_q_test(x, alpha = 0.05, sim = 20000, lazy = False, random_state = None, method = 'mc', deseasonalize = None):
+    """
+    This function checks homogeneity test using Buishand's Q statistics method proposed in T. A. Buishand (1982).
+    Input:
+        x: a vector (list, numpy array or pandas series) data
+        alpha: significance level (default 0.05)
+        sim: No. of monte carlo simulation for p-value calculation (default 20000)
+        lazy: if True, p and h are only computed on first access (default False)
+        random_state: seed (int or SeedSequence) or numpy Generator of the monte carlo simulation
+                      (default None, uses numpy's global random state)
+        method: p-value simulation method, 'mc' (plain monte carlo), 'qmc' (randomized quasi-monte carlo),
+                'control' (monte carlo with control variates), 'importance' (importance sampling, for very
+                small p-values), 'permutation' (permutations of the observed series, for tied or non-normal
+                data), 'block_bootstrap' (block bootstrap of the series, for autocorrelated data) or 'ar1'
+                (AR(1) null with the estimated lag-1 autocorrelation, interpolated between cached nulls on a
+                grid of phi) (default 'mc')
+        deseasonalize: None (default), 'month' or 'dayofyear' to test the anomalies from the monthly or daily
+                       climatology, computed from the datetime index of x (Feb 29 shares the climatology
+                       of Feb 28, every season needs at least 2 valid values)
+    Output:
+        h: True (if data is nonhomogeneous) or False (if data is homogeneous)
+        cp: probable change-point location index
+        p: p-value of the significance test
+        Q: Maximum of absolute Buishand's Q Statistics divided by squire root of sample size [Q/sqrt(n)]
+        avg: mean values at before and after change-point
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> x = np.random.rand(1000)
+      >>> h, cp, p, Q, mu = hg.buishand_q_test(x, 0.05)
+    """
+    res = namedtuple('Buishand_Q_Test', ['h', 'cp', 'p', 'Q', 'avg'])
+
+    return __test(res, 'buishand_q', x, alpha, sim, lazy, random_state, method, deseasonalize)
+
+
+def buishand_range_test(x, alpha = 0.05, sim = 20000, lazy = False, random_state = None, method = 'mc', deseasonalize = None):
+    """
+    This function checks homogeneity test using Buishand's range method proposed in T. A. Buishand (1982).
+    Input:
+        x: a vector (list, numpy array or pandas series) data
+        alpha: significance level (default 0.05)
+        sim: No. of monte carlo simulation for p-value calculation (default 20000)
+        lazy: if True, p and h are only computed on first access (default False)
+        random_state: seed (int or SeedSequence) or numpy Generator of the monte carlo simulation
+                      (default None, uses numpy's global random state)
+        method: p-value simulation method, 'mc' (plain monte carlo), 'qmc' (randomized quasi-monte carlo),
+                'control' (monte carlo with control variates), 'importance' (importance sampling, for very
+                small p-values), 'permutation' (permutations of the observed series, for tied or non-normal
+                data), 'block_bootstrap' (block bootstrap of the series, for autocorrelated data) or 'ar1'
+                (AR(1) null with the estimated lag-1 autocorrelation, interpolated between cached nulls on a
+                grid of phi) (default 'mc')
+        deseasonalize: None (default), 'month' or 'dayofyear' to test the anomalies from the monthly or daily
+                       climatology, computed from the datetime index of x (Feb 29 shares the climatology
+                       of Feb 28, every season needs at least 2 valid values)
+    Output:
+        h: True (if data is nonhomogeneous) or False (if data is homogeneous)
+        cp: probable change-point location index
+        p: p-value of the significance test
+        R: Buishand's Q Statistics range divided by squire root of sample size [R/sqrt(n)]
+        avg: mean values at before and after change-point
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> x = np.random.rand(1000)
+      >>> h, cp, p, R, mu = hg.buishand_range_test(x, 0.05)
+    """
+    res = namedtuple('Buishand_Range_Test', ['h', 'cp', 'p', 'R', 'avg'])
+
+    return __test(res, 'buishand_range', x, alpha, sim, lazy, random_state, method, deseasonalize)
+
+
+def buishand_likelihood_ratio_test(x, alpha = 0.05, sim = 20000, lazy = False, random_state = None, method = 'mc', deseasonalize = None):
+    """
+    This function checks homogeneity test using Buishand's likelihood ration method proposed in T. A. Buishand (1984).
+    Input:
+        x: a vector (list, numpy array or pandas series) data
+        alpha: significance level (default 0.05)
+        sim: No. of monte carlo simulation for p-value calculation (default 20000)
+        lazy: if True, p and h are only computed on first access (default False)
+        random_state: seed (int or SeedSequence) or numpy Generator of the monte carlo simulation
+                      (default None, uses numpy's global random state)
+        method: p-value simulation method, 'mc' (plain monte carlo), 'qmc' (randomized quasi-monte carlo),
+                'control' (monte carlo with control variates), 'importance' (importance sampling, for very
+                small p-values), 'permutation' (permutations of the observed series, for tied or non-normal
+                data), 'block_bootstrap' (block bootstrap of the series, for autocorrelated data) or 'ar1'
+                (AR(1) null with the estimated lag-1 autocorrelation, interpolated between cached nulls on a
+                grid of phi) (default 'mc')
+        deseasonalize: None (default), 'month' or 'dayofyear' to test the anomalies from the monthly or daily
+                       climatology, computed from the datetime index of x (Feb 29 shares the climatology
+                       of Feb 28, every season needs at least 2 valid values)
+    Output:
+        h: True (if data is nonhomogeneous) or False (if data is homogeneous)
+        cp: probable change-point location index
+        p: p-value of the significance test
+        V: Maximum of absolute Buishand's weighted adjusted partial sum S
+        avg: mean values at before and after change-point
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> x = np.random.rand(1000)
+      >>> h, cp, p, V, mu = hg.buishand_range_test(x, 0.05)
+    """
+    res = namedtuple('Buishand_Likelihood_Ratio_Test', ['h', 'cp', 'p', 'V', 'avg'])
+
+    return __test(res, 'buishand_likelihood_ratio', x, alpha, sim, lazy, random_state, method, deseasonalize)
+
+
+def buishand_u_test(x, alpha = 0.05, sim = 20000, lazy = False, random_state = None, method = 'mc', deseasonalize = None):
+    """
+    This function checks homogeneity test using Buishand's U statistics method method proposed in T. A. Buishand (1984).
+    Input:
+        x: a vector (list, numpy array or pandas series) data
+        alpha: significance level (default 0.05)
+        sim: No. of monte carlo simulation for p-value calculation (default 20000)
+        lazy: if True, p and h are only computed on first access (default False)
+        random_state: seed (int or SeedSequence) or numpy Generator of the monte carlo simulation
+                      (default None, uses numpy's global random state)
+        method: p-value simulation method, 'mc' (plain monte carlo), 'qmc' (randomized quasi-monte carlo),
+                'control' (monte carlo with control variates), 'importance' (importance sampling, for very
+                small p-values), 'permutation' (permutations of the observed series, for tied or non-normal
+                data), 'block_bootstrap' (block bootstrap of the series, for autocorrelated data) or 'ar1'
+                (AR(1) null with the estimated lag-1 autocorrelation, interpolated between cached nulls on a
+                grid of phi) (default 'mc')
+        deseasonalize: None (default), 'month' or 'dayofyear' to test the anomalies from the monthly or daily
+                       climatology, computed from the datetime index of x (Feb 29 shares the climatology
+                       of Feb 28, every season needs at least 2 valid values)
+    Output:
+        h: True (if data is nonhomogeneous) or False (if data is homogeneous)
+        cp: probable change-point location index
+        p: p-value of the significance test
+        U: Buishand's U Statistics
+        avg: mean values at before and after change-point
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> x = np.random.rand(1000)
+      >>> h, cp, p, U, mu = hg.buishand_u_test(x, 0.05)
+    """
+    res = namedtuple('Buishand_U_Test', ['h', 'cp', 'p', 'U', 'avg'])
+
+    return __test(res, 'buishand_u', x, alpha, sim, lazy, random_state, method, deseasonalize)
+
+
+def snht_two_shift_test(x, alpha = 0.05, sim = 20000, lazy = False, random_state = None, method = 'mc', deseasonalize = None):
+    """
+    This function checks homogeneity test using the two-shift SNHT of H. Alexandersson and A. Moberg (1997),
+    which looks for two mean shifts at once. All pairs of break points are evaluated from prefix sums.
+    Input:
+        x: a vector (list, numpy array or pandas series) data
+        alpha: significance level (default 0.05)
+        sim: No. of monte carlo simulation for p-value calculation (default 20000)
+        lazy: if True, p and h are only computed on first access (default False)
+        random_state: seed (int or SeedSequence) or numpy Generator of the monte carlo simulation
+                      (default None, uses numpy's global random state)
+        method: p-value simulation method, as in snht_test, except 'importance' (default 'mc')
+        deseasonalize: None (default), 'month' or 'dayofyear' to test the anomalies from the monthly or daily
+                       climatology, computed from the datetime index of x (Feb 29 shares the climatology
+                       of Feb 28, every season needs at least 2 valid values)
+    Output:
+        h: True (if data is nonhomogeneous) or False (if data is homogeneous)
+        cp: probable change-point location indices (last index before the first shift, last index before the second)
+        p: p-value of the significance test
+        T: Maximum of two-shift SNHT T Statistics
+        avg: mean values before, between and after the change-points
+        With less than 3 valid values, T is nan and the other fields None.
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> x = np.random.rand(100)
+      >>> h, (cp1, cp2), p, T, mu = hg.snht_two_shift_test(x, 0.05)
+    """
+    res = namedtuple('SNHT_Two_Shift_Test', ['h', 'cp', 'p', 'T', 'avg'])
+
+    return __test(res, 'snht_two_shift', x, alpha, sim, lazy, random_state, method, deseasonalize)
+
+
+def snht_trend_test(x, alpha = 0.05, sim = 20000, lazy = False, random_state = None, method = 'mc', deseasonalize = None):
+    """
+    This function checks homogeneity test using the trend-shift SNHT of H. Alexandersson and A. Moberg (1997),
+    where the mean changes linearly from one level to another between two break points. All pairs of break
+    points are evaluated from prefix sums.
+    Input:
+        x: a vector (list, numpy array or pandas series) data
+        alpha: significance level (default 0.05)
+        sim: No. of monte carlo simulation for p-value calculation (default 20000)
+        lazy: if True, p and h are only computed on first access (default False)
+        random_state: seed (int or SeedSequence) or numpy Generator of the monte carlo simulation
+                      (default None, uses numpy's global random state)
+        method: p-value simulation method, as in snht_test, except 'importance' (default 'mc')
+        deseasonalize: None (default), 'month' or 'dayofyear' to test the anomalies from the monthly or daily
+                       climatology, computed from the datetime index of x (Feb 29 shares the climatology
+                       of Feb 28, every season needs at least 2 valid values)
+    Output:
+        h: True (if data is nonhomogeneous) or False (if data is homogeneous)
+        cp: probable change-point location indices (last index before the trend, last index of the trend)
+        p: p-value of the significance test
+        T: Maximum of trend-shift SNHT T Statistics
+        avg: mean values before and after the trend
+        With less than 3 valid values, T is nan and the other fields None.
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> x = np.random.rand(100)
+      >>> h, (start, end), p, T, mu = hg.snht_trend_test(x, 0.05)
+    """
+    res = namedtuple('SNHT_Trend_Test', ['h', 'cp', 'p', 'T', 'avg'])
+
+    return __test(res, 'snht_trend', x, alpha, sim, lazy, random_state, method, deseasonalize)
+
+
+def variance_lr_test(x, alpha = 0.05, sim = 20000, lazy = False, random_state = None, method = 'mc', deseasonalize = None):
+    """
+    This function checks homogeneity of the variance (e.g. after an instrument change) using the normal
+    likelihood ratio of one variance change, scanned over the running sums of squared deviations from the mean.
+    Input:
+        x: a vector (list, numpy array or pandas series) data
+        alpha: significance level (default 0.05)
+        sim: No. of monte carlo simulation for p-value calculation (default 20000)
+        lazy: if True, p and h are only computed on first access (default False)
+        random_state: seed (int or SeedSequence) or numpy Generator of the monte carlo simulation
+                      (default None, uses numpy's global random state)
+        method: p-value simulation method, as in snht_test, except 'importance' (default 'mc')
+        deseasonalize: None (default), 'month' or 'dayofyear' to test the anomalies from the monthly or daily
+                       climatology, computed from the datetime index of x (Feb 29 shares the climatology
+                       of Feb 28, every season needs at least 2 valid values)
+    Output:
+        h: True (if data is nonhomogeneous) or False (if data is homogeneous)
+        cp: probable change-point location index
+        p: p-value of the significance test
+        L: Maximum of the likelihood ratio statistics
+        sd: standard deviations before and after change-point
+        With less than 4 valid values, L is nan and the other fields None.
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> x = np.random.rand(1000)
+      >>> h, cp, p, L, sd = hg.variance_lr_test(x, 0.05)
+    """
+    res = namedtuple('Variance_LR_Test', ['h', 'cp', 'p', 'L', 'sd'])
+
+    return __test(res, 'variance_lr', x, alpha, sim, lazy, random_state, method, deseasonalize)
+
+
+def ragged_test(values, offsets, test = 'snht', alpha = 0.05, sim = 20000, lazy = False, random_state = None, method = 'mc'):
+    """
+    This function checks homogeneity of a batch of series with different lengths, stored in ragged (CSR-style) form.
+    Input:
+        values: a flat vector (list or numpy array) holding all series one after another
+        offsets: a vector of m+1 positions, series i is values[offsets[i]:offsets[i+1]]
+        test: name of the homogeneity test, one of 'pettitt', 'snht', 'buishand_q', 'buishand_range',
+              'buishand_likelihood_ratio', 'buishand_u', 'snht_two_shift', 'snht_trend' or 'variance_lr' (default 'snht')
+              or a list of names, to run several tests from one pass of running sums and one simulation
+        alpha: significance level (default 0.05)
+        sim: No. of monte carlo simulation for p-value calculation (default 20000)
+        lazy: if True, the p and h columns are only computed on first access (default False)
+        random_state: seed (int or SeedSequence) or numpy Generator of the monte carlo simulation
+                      (default None, uses numpy's global random state)
+        method: p-value simulation method, 'mc' (plain monte carlo), 'qmc' (randomized quasi-monte carlo),
+                'control' (monte carlo with control variates), 'importance' (importance sampling, for very
+                small p-values), 'permutation' (permutations of the observed series, for tied or non-normal
+                data), 'block_bootstrap' (block bootstrap of the series, for autocorrelated data) or 'ar1'
+                (AR(1) null with the estimated lag-1 autocorrelation, interpolated between cached nulls on a
+                grid of phi) (default 'mc')
+    Output:
+        a BatchResult with columns h (nan where p is nan), cp (1-based position within the series),
+        p (nan if sim is None, except for pettitt), p_se, stat, mu1, mu2, n_eff and n_sim; one entry per series,
+        nan for series with less than two valid values (three for 'snht_two_shift' and 'snht_trend', four
+        for 'variance_lr'); with 'snht_two_shift' or 'snht_trend', cp, mu1 and mu2 refer to the first
+        change-point, with 'variance_lr' mu1 and mu2 are the standard deviations before and after it.
+        For a list of tests, a dict of BatchResults by test name
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> values = np.random.rand(250)
+      >>> offsets = [0, 20, 120, 250]
+      >>> res = hg.ragged_test(values, offsets, 'snht')
+      >>> df = res.to_pandas()
+    """
+    for t in [test] if isinstance(test, str) else test:
+        if t not in __tests:
+            raise ValueError('Unknown homogeneity test: {}'.format(t))
+    
+    values = np.asarray(values, dtype=float).ravel()
+    offsets = np.asarray(offsets, dtype=np.intp)
+    
+    if offsets.ndim != 1 or len(offsets) < 2 or offsets[0] != 0 or offsets[-1] != len(values) or (np.diff(offsets) < 0).any():
+        raise ValueError('offsets must be non-decreasing, start at 0 and end at len(values).')
+    
+    return __ragged_test(test, values, offsets, alpha, sim, lazy, random_state, method)
+
+
+def grouped_test(df, by, value, test = 'snht', alpha = 0.05, sim = 20000, time = None, random_state = None, method = 'mc'):
+    """
+    This function checks homogeneity of every group of a long-format table (e.g. station_id, date, value) in one vectorized pass.
+    Input:
+        df: a pandas DataFrame in long format
+        by: column name (or list of column names) identifying the series
+        value: column name of the observations
+        test: name of the homogeneity test, one of 'pettitt', 'snht', 'buishand_q', 'buishand_range',
+              'buishand_likelihood_ratio', 'buishand_u', 'snht_two_shift', 'snht_trend' or 'variance_lr' (default 'snht')
+        alpha: significance level (default 0.05)
+        sim: No. of monte carlo simulation for p-value calculation (default 20000)
+        time: column name used to order observations within each group (default None, keeps row order)
+        random_state: seed (int or SeedSequence) or numpy Generator of the monte carlo simulation
+                      (default None, uses numpy's global random state)
+        method: p-value simulation method, 'mc' (plain monte carlo), 'qmc' (randomized quasi-monte carlo),
+                'control' (monte carlo with control variates), 'importance' (importance sampling, for very
+                small p-values), 'permutation' (permutations of the observed series, for tied or non-normal
+                data), 'block_bootstrap' (block bootstrap of the series, for autocorrelated data) or 'ar1'
+                (AR(1) null with the estimated lag-1 autocorrelation, interpolated between cached nulls on a
+                grid of phi) (default 'mc')
+    Output:
+        a pandas DataFrame with one row per group holding the group key(s) and the BatchResult columns
+        h, cp (time value if time is given, otherwise 1-based position in the group), p, p_se, stat, mu1, mu2, n_eff and n_sim
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> res = hg.grouped_test(df, by='station_id', value='value', test='pettitt', time='date')
+    """
+    import pandas as pd
+    
+    keys = [by] if np.isscalar(by) else list(by)
+    code = df.groupby(keys, sort=True).ngroup().to_numpy(dtype=float)
+    
+    # sort once, rows with missing keys (-1 or NaN depending on pandas) are dropped
+    code = np.nan_to_num(code, nan=-1).astype(np.intp)
+    if time is None:
+        order = np.argsort(code, kind='stable')
+    else:
+        order = np.lexsort((df[time].to_numpy(), code))
+    
+    order = order[code[order] >= 0]
+    offsets = np.r_[0, np.bincount(code[order]).cumsum()]
+    values = df[value].to_numpy(dtype=float)[order]
+    
+    res = __ragged_test(test, values, offsets, alpha, sim, random_state=random_state, method=method).to_pandas()
+    
+    if time is not None:
+        t = df[time].to_numpy()[order]
+        valid = ~np.isnan(res.cp.to_numpy())
+        loc = np.where(valid, offsets[:-1] + np.nan_to_num(res.cp.to_numpy()).astype(int) - 1, 0)
+        res['cp'] = pd.Series(t[loc]).where(valid)
+    
+    key = df[keys].iloc[order[offsets[:-1]]].reset_index(drop=True)
+    res = pd.concat([key, res], axis=1)
+    
+    return res
+
+
+def batch_test(x, test = 'snht', alpha = 0.05, sim = 20000, detrend = False, prewhiten = False, deseasonalize = None, by_period = None, lazy = False, random_state = None, method = 'mc'):
+    """
+    This function checks homogeneity of every column of a 2D dataset (e.g. one station per column) in one
+    vectorized pass, with optional deseasonalizing, detrending and prewhitening of all columns at once, or of
+    the sub-series of every period (e.g. the 12 calendar months) of every column.
+    Input:
+        x: a 2D array or pandas DataFrame of shape (n, c), one series per column (nan for missing values)
+        test: name of the homogeneity test, one of 'pettitt', 'snht', 'buishand_q', 'buishand_range',
+              'buishand_likelihood_ratio', 'buishand_u', 'snht_two_shift', 'snht_trend' or 'variance_lr' (default 'snht')
+              or a list of names (a dict of results by test name)
+        alpha: significance level (default 0.05)
+        sim: No. of monte carlo simulation for p-value calculation (default 20000)
+        detrend: if True, the least squares linear trend of every column is removed (default False)
+        prewhiten: if True, every column is prewhitened with its estimated lag-1 autocorrelation, restarting
+                   after every missing value (default False)
+        deseasonalize: None (default), 'month' or 'dayofyear' to test the anomalies from the monthly or daily
+                       climatology of every column, computed from the datetime index of x (Feb 29 shares
+                       the climatology of Feb 28, every season needs at least 2 valid values)
+        by_period: None (default), 'month' to test the 12 calendar month sub-series of every column (from the
+                   datetime index of x), 'dayofyear' for the 365 calendar day sub-series, or a vector of n
+                   period labels, one sub-series per distinct label
+        lazy: if True, the p and h columns are only computed on first access (default False)
+        random_state: seed (int or SeedSequence) or numpy Generator of the monte carlo simulation
+                      (default None, uses numpy's global random state)
+        method: p-value simulation method, as in ragged_test (default 'mc')
+    Output:
+        a BatchResult with one entry per column (see ragged_test), cp is the 1-based row position;
+        mu1 and mu2 refer to the preprocessed series. With by_period, one entry per column and period,
+        column j and period s (in sorted label order) at j * No. of periods + s
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> res = hg.batch_test(df, 'snht', deseasonalize='month', detrend=True, prewhiten=True)
+      >>> df.index[res.cp.astype(int) - 1]
+      >>> res = hg.batch_test(df, 'snht', by_period='month')
+      >>> p = res.p.reshape(-1, 12)
+    """
+    for t in [test] if isinstance(test, str) else test:
+        if t not in __tests:
+            raise ValueError('Unknown homogeneity test: {}'.format(t))
+    
+    if isinstance(by_period, str) and by_period not in ('month', 'dayofyear'):
+        raise ValueError("by_period must be 'month', 'dayofyear' or a vector of period labels.")
+    
+    x, c, idx = __preprocessing(x)
+    season = __season_codes(idx, deseasonalize) if deseasonalize else None
+    
+    # one fortran ordered working copy, so that the (c, n) series rows are contiguous
+    values = np.array(x, dtype=float, order='F')
+    values = values.reshape(len(values), -1).T
+    n = values.shape[1]
+    
+    __batch_preprocessing(values, detrend, prewhiten, season)
+    
+    if by_period is None:
+        return __ragged_test(test, values.ravel(), np.arange(0, values.size + 1, max(n, 1)), alpha, sim, lazy, random_state, method)
+    
+    if isinstance(by_period, str):
+        codes, S = __season_codes(idx, by_period)
+    else:
+        labels, codes = np.unique(np.asarray(by_period), return_inverse=True)
+        S = len(labels)
+        
+        if len(codes) != n:
+            raise ValueError('by_period must hold one period label per row of x.')
+    
+    # one stable sort puts the sub-series of every period one after another in time order;
+    # all sub-series of the same length share one null distribution
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes, minlength=S)
+    starts = np.r_[0, counts.cumsum()]
+    offsets = np.r_[0, np.tile(counts, len(values)).cumsum()]
+    
+    res = __ragged_test(test, values[:, order].ravel(), offsets, alpha, sim, lazy, random_state, method)
+    
+    # cp back to the row of x
+    for r in res.values() if isinstance(res, dict) else [res]:
+        cp = r.columns['cp']
+        valid = ~np.isnan(cp)
+        r.columns['cp'][valid] = order[np.tile(starts[:-1], len(values))[valid] + cp[valid].astype(int) - 1] + 1
+    
+    return res
+
+
+def multiresolution_test(x, levels = ('D', 'M', 'Y'), test = 'snht', alpha = 0.05, sim = 20000, lazy = False, random_state = None, method = 'mc'):
+    """
+    This function checks homogeneity of one long series at several temporal resolutions (e.g. an hourly record
+    aggregated to daily, monthly and annual means) in one vectorized pass. The prefix sums of the series are
+    computed once, and the mean of every aggregated bin at every level is the difference of two of them.
+    Input:
+        x: a vector (list, numpy array or pandas series) data, sorted by time (nan for missing values)
+        levels: aggregation levels, each either an int (No. of observations per bin) or a numpy datetime unit
+                ('h', 'D', 'W', 'M' or 'Y', calendar bins from the datetime index of x) (default ('D', 'M', 'Y'))
+        test: name of the homogeneity test, one of 'pettitt', 'snht', 'buishand_q', 'buishand_range',
+              'buishand_likelihood_ratio', 'buishand_u', 'snht_two_shift', 'snht_trend' or 'variance_lr' (default 'snht')
+        alpha: significance level (default 0.05)
+        sim: No. of monte carlo simulation for p-value calculation (default 20000)
+        lazy: if True, the p and h columns are only computed on first access (default False)
+        random_state: seed (int or SeedSequence) or numpy Generator of the monte carlo simulation
+                      (default None, uses numpy's global random state)
+        method: p-value simulation method, as in ragged_test (default 'mc')
+    Output:
+        a BatchResult with one entry per level (see ragged_test), cp is the timestamp of the last observation
+        of the bin before the change (NaT if not tested, in UTC for a tz-aware index) for a datetime index,
+        else its 1-based position in x;
+        mu1 and mu2 are means of the bin means, n_eff the No. of non-empty bins
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> res = hg.multiresolution_test(hourly, ('D', 'M', 'Y'), 'snht')
+      >>> res.to_pandas().set_index(pd.Index(['D', 'M', 'Y']))
+    """
+    if test not in __tests:
+        raise ValueError('Unknown homogeneity test: {}'.format(test))
+    
+    t = getattr(x, 'index', None)
+    
+    if t is not None:
+        import pandas as pd
+        
+        # calendar bins of a tz-aware index are taken in UTC, any other index falls back to positions
+        if isinstance(t, pd.DatetimeIndex):
+            t = (t if t.tz is None else t.tz_convert(None)).values
+        else:
+            t = None
+    
+    values = np.asarray(x, dtype=float).ravel()
+    n = len(values)
+    
+    # the prefix sums of the values and of the No. of valid values, read once for all levels
+    valid = ~np.isnan(values)
+    P = np.r_[0.0, np.where(valid, values, 0.0).cumsum()]
+    C = np.r_[0, valid.cumsum()]
+    
+    bins = []
+    
+    for level in levels:
+        if isinstance(level, str):
+            if t is None:
+                raise ValueError('Calendar levels need a pandas series with a datetime index.')
+            
+            label = t.astype('datetime64[{}]'.format(level))
+            b = np.r_[0, np.flatnonzero(label[1:] != label[:-1]) + 1, n]
+        else:
+            b = np.r_[np.arange(0, n, int(level)), n]
+        
+        bins.append(b)
+    
+    sizes = np.array([len(b) - 1 for b in bins])
+    b = np.concatenate([v[:-1] for v in bins])
+    e = np.concatenate([v[1:] for v in bins])
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = (P[e] - P[b]) / (C[e] - C[b])
+    
+    res = __ragged_test(test, means, np.r_[0, sizes.cumsum()], alpha, sim, lazy, random_state, method)
+    
+    # cp back to the last raw observation of the bin before the change
+    cp = res.columns['cp']
+    ok = ~np.isnan(cp)
+    last = e[np.r_[0, sizes[:-1]].cumsum()[ok] + cp[ok].astype(int) - 1] - 1
+    
+    if t is None:
+        res.columns['cp'][ok] = last + 1
+    else:
+        res.columns['cp'] = np.full(len(cp), np.datetime64('NaT'), dtype=t.dtype)
+        res.columns['cp'][ok] = t[last]
+    
+    return res
+
+
+def stream_test(x, test = 'snht', alpha = 0.05, sim = 20000, chunk = 2**20, random_state = None, method = 'asymptotic'):
+    """
+    This function checks homogeneity of a series too long to be loaded into memory, in two streaming passes
+    over chunks of the data (the mean and standard deviation first, then the partial sums, the test statistics
+    and its location), with O(chunk) memory.
+    Input:
+        x: a numpy array or np.memmap (or another array like supporting len and slicing, e.g. a h5py dataset),
+           a re-iterable of chunks (e.g. a list of arrays), or a callable returning a fresh iterable of chunks
+           (nan for missing values)
+        test: name of the homogeneity test, one of 'snht', 'buishand_q', 'buishand_range',
+              'buishand_likelihood_ratio' or 'buishand_u' (default 'snht')
+        alpha: significance level (default 0.05)
+        sim: No. of monte carlo simulation for the simulated methods (default 20000), None for no p-value
+        chunk: No. of values per chunk of an array like x (default 2**20)
+        random_state: seed (int or SeedSequence) or numpy Generator of the monte carlo simulation (default None)
+        method: 'asymptotic' (limiting null distribution, default), or 'mc', 'qmc', 'control' or 'importance'
+                (simulated null of the same length, cached and stored as for the other tests). Simulating
+                costs sim * n time and n memory per simulated series, so for n above chunk the simulated
+                methods need a seeded null already in the cache or null store (see warm_cache)
+    Output:
+        h: True (if data is nonhomogeneous) or False (if data is homogeneous)
+        cp: probable change point location, the 1-based position in x
+        p: p-value of the significance test
+        stat: test statistics of the selected test
+        n: No. of valid (non-missing) values
+        avg: mean values at before and after change point
+    Examples
+    --------
+      >>> import numpy as np
+      >>> import pyhomogeneity as hg
+      >>> x = np.memmap('sensor.f4', dtype='float32', mode='r')
+      >>> h, cp, p, stat, n, avg = hg.stream_test(x, 'buishand_q', chunk=2**22)
+    """
+    res = namedtuple('Stream_Test', ['h', 'cp', 'p', 'stat', 'n', 'avg'])
+    
+    if test == 'pettitt':
+        raise ValueError('The Pettitt test needs ranks, use stream_pettitt_test.')
+    
+    if test not in __tests or test in __two_break + ('variance_lr',):
+        raise ValueError('Unknown streaming homogeneity test: {}'.format(test))
+    
+    if method not in ('asymptotic',) + __methods + ('importance',):
+        raise ValueError('Unknown p-value method: {}'.format(method))
+    
+    stat, cp, n, avg = __stream_stat(test, x, int(chunk))
+    
+    if method == 'asymptotic':
+        p = float(__asymptotic_p_value(test, stat, n))
+    elif sim:
+        if n > chunk and not __null_available(test, n, sim, random_state, method):
+            raise ValueError("Simulated p-values of series longer than chunk need a seeded null in the cache or "
+                             "null store (see warm_cache), or use method='asymptotic'.")
+        
+        p = __mc_p_value(test, stat, n, sim, random_state, method)
+    else:
+        return res(None, cp, None, stat, n, avg)
+    
+    return res(alpha > p, cp, p, stat, n, avg)
+
+
+def stream_pettitt_test(x, alpha = 0.05, eps = 1e-4, chunk = 2**20):
+    """
+    This function is an approximate out-of-core Pettitt test for series too long to be ranked in memory.
+    A mergeable quantile sketch of the data is built in a first streaming pass (chunks are summarized in
+    parallel threads, see set_options(threads=...)), and the second pass accumulates the Pettitt statistics
+    from the ranks estimated with the sketch. The rank of every value is within delta of its exact (mid) rank,
+    where delta is reported, about eps * n * (1 + log2(No. of chunks)) / 2, so every partial statistics U_k is
+    within 2 delta k of the exact one. With fewer than 1 / eps values per chunk the test is exact.
+    Input:
+        x: a numpy array or np.memmap (or another array like supporting len and slicing), a re-iterable of
+           chunks, or a callable returning a fresh iterable of chunks (nan for missing values)
+        alpha: significance level (default 0.05)
+        eps: relative rank resolution of the sketch, which keeps about 1 / eps points per level (default 1e-4)
+        chunk: No. of values per chunk of an array like x (default 2**20)
+    Output:
+        h: True (if data is nonhomogeneous) or False (if data is homogeneous)
+        cp: probable change point location, the 1-based position in x
+        p: p-value of the significance test (Pettitt's approximation, from the estimated U)
+        U: estimated test statistics
+        n: No. of valid (non-missing) values
+        avg: mean values at before and after change point
+        U_err: bound on the difference between U and the exact test statistics (2 delta n)
+        cp_range: (first, last) 1-based positions in x between which the exact change point lies
+    Examples
+    --------
+      >>> import numpy as np
+      >>> import pyhomogeneity as hg
+      >>> x = np.memmap('sensor.f4', dtype='float32', mode='r')
+      >>> res = hg.stream_pettitt_test(x, eps=1e-5, chunk=2**22)
+    """
+    res = namedtuple('Stream_Pettitt_Test', ['h', 'cp', 'p', 'U', 'n', 'avg', 'U_err', 'cp_range'])
+    
+    sketch = __stream_sketch(x, int(chunk), int(np.ceil(1 / eps)))
+    n = int(sketch.w.sum())
+    
+    if n < 2:
+        raise ValueError('At least 2 valid values are needed.')
+    
+    C = np.r_[0, np.cumsum(sketch.w)]
+    delta = sketch.slack / 2
+    
+    # envelope of |U_k| over blocks of B consecutive values, to bound the change point location
+    B = max(int(np.ceil(2 * delta)), -(-n // 2**16), 1)
+    env = np.full(-(-n // B), -np.inf)
+    first = np.zeros(len(env), dtype=np.int64)
+    last = np.zeros(len(env), dtype=np.int64)
+    
+    best, loc, cp, sum_loc = -np.inf, 0, 0, 0.0
+    U0, k0, r0, total = 0.0, 0, 0, 0.0
+    
+    for c in __stream_chunks(x, int(chunk)):
+        valid = np.flatnonzero(~np.isnan(c))
+        v = c[valid]
+        r = (C[np.searchsorted(sketch.v, v, side='right')] + C[np.searchsorted(sketch.v, v, side='left')] + 1) / 2 + delta
+        U = U0 + np.cumsum(2 * r - (n + 1))
+        k = k0 + np.arange(1, len(v) + 1)
+        a = np.where(k < n, abs(U), -np.inf)
+        
+        if len(v):
+            b = (k - 1) // B
+            start = np.r_[0, np.flatnonzero(np.diff(b)) + 1]
+            ub = b[start]
+            np.maximum.at(env, ub, np.maximum.reduceat(a, start))
+            first[ub] = np.where(first[ub] > 0, first[ub], r0 + valid[start] + 1)
+            last[ub] = r0 + valid[np.r_[start[1:], len(v)] - 1] + 1
+            
+            if a.max() > best:
+                i = a.argmax()
+                best, loc, cp, sum_loc = a[i], k[i], r0 + valid[i] + 1, total + v[:i + 1].sum()
+            
+            U0, total = U[-1], total + v.sum()
+        
+        k0, r0 = k0 + len(v), r0 + len(c)
+    
+    # the exact maximum lies in a block whose upper bound reaches the lower bound at loc
+    k_hi = np.minimum((np.arange(len(env)) + 1) * B, n)
+    ok = np.flatnonzero(env + 2 * delta * k_hi >= best - 2 * delta * loc)
+    
+    mu = namedtuple('mean', ['mu1', 'mu2'])
+    avg = mu(sum_loc / loc, (total - sum_loc) / (n - loc))
+    p = 2 * np.exp((- 6 * best**2) / (float(n)**3 + n**2))
+    
+    return res(alpha > p, cp, p, best, n, avg, 2 * delta * n, (first[ok[0]], last[ok[-1]]))
+
+
+def cp_confidence(x, test = 'snht', level = 0.95, n_boot = 1000, random_state = None, chunk = 2**20):
+    """
+    This function gives a bootstrap confidence interval of the change point location. The residuals around the
+    fitted two-mean model (the means before and after the change point) are resampled into a (n_boot, n)
+    matrix of replicates, whose change points are located with the vectorized batch kernels, in blocks of about
+    chunk values that run in parallel threads (see set_options(threads=...)).
+    Input:
+        x: a vector (list, numpy array or pandas series) data
+        test: name of the homogeneity test, one of 'pettitt', 'snht', 'buishand_q', 'buishand_range',
+              'buishand_likelihood_ratio' or 'buishand_u' (default 'snht')
+        level: confidence level (default 0.95)
+        n_boot: No. of bootstrap replicates (default 1000)
+        random_state: seed (int or SeedSequence) or numpy Generator of the bootstrap
+                      (default None, uses numpy's global random state)
+        chunk: No. of values per block of replicates (default 2**20)
+    Output:
+        cp: probable change point location, as in the test functions
+        lower: lower bound of the change point location
+        upper: upper bound of the change point location
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> cp, lower, upper = hg.cp_confidence(x, 'pettitt', level=0.9, n_boot=2000, random_state=0)
+    """
+    res = namedtuple('CP_Confidence', ['cp', 'lower', 'upper'])
+    
+    if test not in __tests or test in __two_break + ('variance_lr',):
+        raise ValueError('Unknown mean change-point test: {}'.format(test))
+    
+    x, c, idx = __preprocessing(x)
+    x, n, idx = __missing_values_analysis(x, idx, method = 'skip')
+    x = np.asarray(x, dtype=float)
+    
+    stat, loc = __tests[test](x)
+    mu = __mean(x, loc)
+    fit = np.where(np.arange(n) < loc, mu.mu1, mu.mu2)
+    e = x - fit
+    
+    rng = __random_generator(random_state, n, test)[0]
+    rows = max(1, chunk // n)
+    sizes = [min(rows, n_boot - i) for i in range(0, n_boot, rows)]
+    seeds = (rng.integers if rng is not None else np.random.randint)(2**31, size=(len(sizes), 4))
+    
+    def locate(args):
+        seed, size = args
+        X = fit + e[np.random.default_rng(seed).integers(0, n, (size, n))]
+        
+        return __batch_stat(test, X, __dense_layout(size, n))[1]
+    
+    if __options['threads'] > 1 and len(sizes) > 1:
+        with ThreadPoolExecutor(__options['threads']) as pool:
+            locs = np.concatenate(list(pool.map(locate, zip(seeds, sizes))))
+    else:
+        locs = np.concatenate(list(map(locate, zip(seeds, sizes))))
+    
+    lower = int(np.quantile(locs, (1 - level) / 2, method='lower'))
+    upper = int(np.quantile(locs, (1 + level) / 2, method='higher'))
+    
+    return res(idx[loc-1], idx[lower-1], idx[upper-1])
+
+
+def power_curve(test = 'snht', n = 100, shifts = (0, 0.25, 0.5, 0.75, 1, 1.5, 2), positions = (0.25, 0.5, 0.75), sim = 2000, alpha = 0.05, target = 0.8, null_sim = 20000, random_state = None, method = 'mc', chunk = 2**22):
+    """
+    This function estimates the power of a homogeneity test against a single mean shift in standard normal
+    noise, for every combination of shift size and change point position. The same noise (sim, n) block is
+    shifted for all combinations (common random numbers), the shifted series are tested in batches of about
+    chunk values with the vectorized kernels, and p-values come from the cached null distribution.
+    Input:
+        test: name of the homogeneity test, one of 'pettitt', 'snht', 'buishand_q', 'buishand_range',
+              'buishand_likelihood_ratio', 'buishand_u', 'snht_two_shift', 'snht_trend' or 'variance_lr' (default 'snht')
+        n: sample size, or a sequence of sample sizes (default 100)
+        shifts: increasing shift sizes, in units of the noise standard deviation (default (0, 0.25, ..., 2))
+        positions: change point positions as fractions of n (default (0.25, 0.5, 0.75))
+        sim: No. of simulated series per shift and position (default 2000)
+        alpha: significance level (default 0.05)
+        target: power of the minimal detectable shift (default 0.8)
+        null_sim: No. of simulation of the null distribution (default 20000)
+        random_state: seed (int or SeedSequence) or numpy Generator of the simulation
+                      (default None, uses numpy's global random state)
+        method: simulation method of the null distribution, 'mc', 'qmc' or 'control' (default 'mc')
+        chunk: No. of values per batch of shifted series (default 2**22)
+    Output:
+        power: rejection rate at every shift and position, of shape (len(shifts), len(positions)),
+               or (len(n), len(shifts), len(positions)) for a sequence of sample sizes
+        mds: minimal detectable shift at the target power, linearly interpolated between the shifts
+             (nan if not reached), of shape (len(positions),) or (len(n), len(positions))
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> power, mds = hg.power_curve('snht', n=[30, 60, 100], shifts=np.linspace(0, 2, 21), random_state=0)
+    """
+    res = namedtuple('Power_Curve', ['power', 'mds'])
+    
+    if test not in __tests:
+        raise ValueError('Unknown homogeneity test: {}'.format(test))
+    
+    if method not in __methods:
+        raise ValueError('Unknown null distribution method: {}'.format(method))
+    
+    sizes = np.atleast_1d(n).astype(int)
+    shifts = np.asarray(shifts, dtype=float)
+    positions = np.asarray(positions, dtype=float)
+    power = np.zeros((len(sizes), len(shifts), len(positions)))
+    
+    for i, m in enumerate(sizes):
+        null = __null_distribution(test, m, null_sim, random_state, method)
+        
+        # the noise stream is kept apart from the stream of the null distribution
+        if random_state is None or isinstance(random_state, np.random.Generator):
+            rng = random_state
+        else:
+            seq = random_state if isinstance(random_state, np.random.SeedSequence) else np.random.SeedSequence(int(random_state))
+            rng = np.random.default_rng(np.random.SeedSequence(seq.entropy, spawn_key=tuple(seq.spawn_key) + (0, int(m))))
+        
+        Z = __normal(rng, sim, m)
+        rows = max(1, chunk // (sim * m))
+        
+        for j, pos in enumerate(positions):
+            step = (np.arange(m) >= np.clip(int(round(pos * m)), 1, m - 1)).astype(Z.dtype)
+            
+            for b in range(0, len(shifts), rows):
+                d = shifts[b:b + rows]
+                X = (Z[None, :, :] + d[:, None, None].astype(Z.dtype) * step).reshape(-1, m)
+                p = __p_value(null, __batch_stat(test, X, __dense_layout(len(X), m))[0])[0]
+                power[i, b:b + rows, j] = (alpha > p).reshape(len(d), sim).mean(axis=1)
+    
+    # first shift reaching the target, interpolated from the shift before it
+    mds = np.full(power.shape[::2], np.nan)
+    
+    for i, j in np.ndindex(*mds.shape):
+        hit = np.flatnonzero(power[i, :, j] >= target)
+        
+        if len(hit):
+            k = hit[0]
+            mds[i, j] = shifts[k] if k == 0 else np.interp(target, power[i, k - 1:k + 1, j], shifts[k - 1:k + 1])
+    
+    if np.ndim(n) == 0:
+        return res(power[0], mds[0])
+    
+    return res(power, mds)
+
+
+def p_value(test, stat, n, sim = 20000, method = 'mc', random_state = None, phi = 0.0):
+    """
+    This function calculates the simulated p-value of a test statistics together with its estimated standard error,
+    so the No. of simulations can be chosen for a target precision.
+    Input:
+        test: name of the homogeneity test, one of 'pettitt', 'snht', 'buishand_q', 'buishand_range',
+              'buishand_likelihood_ratio', 'buishand_u', 'snht_two_shift', 'snht_trend' or 'variance_lr'
+        stat: test statistics (scalar or array)
+        n: sample size
+        sim: No. of simulation (default 20000)
+        method: 'mc' (plain monte carlo), 'qmc' (scrambled Sobol points through the inverse normal cdf,
+                standard error from independent scrambles), 'control' (monte carlo with a control variate
+                of exactly known mean), 'importance' (importance sampling from the spherical caps of the
+                tail, for p-values far below 1/sim) or 'ar1' (AR(1) null with lag-1 autocorrelation phi)
+                (default 'mc')
+        random_state: seed (int or SeedSequence) or numpy Generator of the simulation (default None)
+        phi: lag-1 autocorrelation of the 'ar1' null (default 0)
+    Output:
+        p: p-value
+        se: estimated standard error of p
+        n_sim: No. of simulated series actually used
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> res = hg.snht_test(x, sim=None)
+      >>> p, se, n_sim = hg.p_value('snht', res.T, len(x), sim=4096, method='control')
+    """
+    res = namedtuple('P_Value', ['p', 'se', 'n_sim'])
+    
+    if test not in __tests:
+        raise ValueError('Unknown homogeneity test: {}'.format(test))
+    
+    if method in __resampling:
+        raise ValueError('{} p-values need the observed series, use the test functions.'.format(method))
+    
+    if method not in __methods + ('importance', 'ar1'):
+        raise ValueError('Unknown p-value method: {}'.format(method))
+    
+    if method == 'ar1':
+        stat, phi = np.broadcast_arrays(np.asarray(stat, dtype=float), np.clip(phi, *__ar1_range))
+        p, se = __ar1_p_values(test, stat.ravel(), n, sim, random_state, phi.ravel())
+        
+        return res(p.reshape(stat.shape), se.reshape(stat.shape), sim)
+    
+    return res(*__p_values(test, stat, n, sim, random_state, method))
+
+
+def resolve(results):
+    """
+    This function computes the pending p-values of many lazy results together, running one
+    vectorized monte carlo simulation per (test, sample size, sim) instead of one per result.
+    Input:
+        results: an iterable of lazy results returned with lazy=True
+    Output:
+        a list with the resolved results (named tuples or BatchResult objects)
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> res = [hg.snht_test(x, lazy=True) for x in data]
+      >>> res = hg.resolve(res)
+    """
+    results = list(results)
+    __resolve([r for r in results if getattr(r, 'pending', None) is not None])
+    
+    return [r.resolve() for r in results]
+
+
+def set_options(**kwargs):
+    """
+    This function sets package wide options of the monte carlo p-value calculation.
+    Input:
+        bit_generator: numpy bit generator used for seeded simulations, e.g. 'PCG64' (default), 'PCG64DXSM',
+                       'Philox', 'SFC64' or 'MT19937'
+        dtype: 'float64' (default) or 'float32' simulation (halves memory bandwidth)
+        common_random_numbers: if True (default), all tests with the same seed and sample size
+                               use the same simulated series
+        cache: if True (default), null distributions of seeded simulations are kept in memory and reused
+        qmc_replicates: No. of independent scrambles of the qmc method, used for its standard error (default 16)
+        tail: None (default) or 'gpd' to extrapolate p-values beyond the upper tail_fraction quantile of the
+              simulated null with a fitted generalized Pareto distribution; the fit is cached with the null
+        tail_fraction: fraction of the simulated statistics used for the tail fit (default 0.05)
+        compact_cache: if True, cached null distributions are stored as compact quantile grids, dense in the upper
+                       tail, instead of all simulated statistics (default False)
+        sketch_error: maximum relative error of p-values from compact nulls; they are never smaller than the
+                      p-values of the full null (default 0.01)
+        null_store: path of an on-disk null store shared by processes, or None (default: the environment variable
+                    PYHOMOGENEITY_NULL_STORE); seeded null distributions are read from it through a memory map
+                    and newly simulated ones are appended under a file lock
+        threads: No. of threads running the chunks of permutation and block bootstrap p-values (default 1)
+        bootstrap: 'stationary' (default, geometric block lengths) or 'moving' (circular moving blocks) block bootstrap
+        block_length: mean block length (at least 1, rounded for moving blocks) of the block bootstrap, or None
+                      (default) to select it for every series (Politis and White, 2004)
+        ar1_step: spacing of the grid of phi values, from -0.5 to 0.95, of the AR(1) nulls (default 0.05)
+    Output:
+        a dict with the previous values of the changed options
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> old = hg.set_options(dtype='float32', bit_generator='SFC64')
+      >>> res = hg.snht_test(x, random_state=42)
+      >>> hg.set_options(**old)
+    """
+    unknown = set(kwargs) - set(__options)
+    
+    if unknown:
+        raise ValueError('Unknown option(s): {}'.format(', '.join(sorted(unknown))))
+    
+    if 'bit_generator' in kwargs and not hasattr(np.random, str(kwargs['bit_generator'])):
+        raise ValueError('Unknown bit generator: {}'.format(kwargs['bit_generator']))
+    
+    if 'dtype' in kwargs and np.dtype(kwargs['dtype']) not in (np.float32, np.float64):
+        raise ValueError('dtype must be float32 or float64.')
+    
+    if kwargs.get('tail') not in (None, 'gpd'):
+        raise ValueError("tail must be None or 'gpd'.")
+    
+    if not 0 < kwargs.get('tail_fraction', 0.05) < 1:
+        raise ValueError('tail_fraction must be between 0 and 1.')
+    
+    if not 0 < kwargs.get('sketch_error', 0.01) < 1:
+        raise ValueError('sketch_error must be between 0 and 1.')
+    
+    if kwargs.get('bootstrap', 'stationary') not in ('stationary', 'moving'):
+        raise ValueError("bootstrap must be 'stationary' or 'moving'.")
+    
+    if kwargs.get('block_length') is not None and not kwargs['block_length'] >= 1:
+        raise ValueError('block_length must be None or at least 1.')
+    
+    old = dict((key, __options[key]) for key in kwargs)
+    __options.update(kwargs)
+    
+    return old
+
+
+def get_options():
+    """
+    This function returns a copy of the package wide options (see set_options).
+    """
+    return dict(__options)
+
+
+def null_distributions(tests = 'all', n_min = 10, n_max = 100, sim = 20000, random_state = None):
+    """
+    This function simulates the null distributions of the test statistics for every sample size n_min..n_max
+    in a single nested-prefix sweep over one (sim, n_max) matrix of iid normal series. The sweep costs O(n_max^2)
+    per simulated series, about 3 to 5 times less than simulating every length separately. The distribution of n_max equals the one used by the tests for the
+    same seed and sim; shorter lengths use prefixes of the same series (so they are correlated across n).
+    Input:
+        tests: name of a single change-point test, a list of names or 'all' (default)
+        n_min: smallest sample size (default 10)
+        n_max: largest sample size (default 100)
+        sim: No. of simulation (default 20000)
+        random_state: seed (int or SeedSequence) or numpy Generator of the simulation (default None)
+    Output:
+        a dict mapping each test name to a dict of sorted simulated statistics by sample size
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> nulls = hg.null_distributions('snht', 10, 500, sim=10000, random_state=42)
+      >>> critical = dict((n, np.quantile(t, 0.95)) for n, t in nulls['snht'].items())
+    """
+    tests = [t for t in __tests if t not in __two_break] if tests == 'all' else [tests] if isinstance(tests, str) else list(tests)
+    unknown = [test for test in tests if test not in __tests or test in __two_break]
+    
+    if unknown:
+        raise ValueError('Unknown homogeneity test(s): {}'.format(', '.join(unknown)))
+    
+    if not 2 <= n_min <= n_max:
+        raise ValueError('Sample sizes must satisfy 2 <= n_min <= n_max.')
+    
+    nulls = __sweep_nulls(tests, int(n_min), int(n_max), int(sim), random_state)
+    
+    return dict((test, dict((n, nulls[(test, n)]) for n in range(n_min, n_max + 1))) for test in tests)
+
+
+# Simulate and store the nulls of one sample size (run in the warm_cache worker processes). Nulls
+# served from the memory cache (also inherited by forked workers) never reach the store on their
+# own, so every null is written here; nulls already in the store are left as they are.
+def __warm_one(args):
+    options, tests, n, sim, random_state, method = args
+    old = dict(__options)
+    __options.update(options, cache=True)
+    
+    try:
+        res = __null_distributions(tests, n, sim, random_state, method)
+        
+        for test in tests:
+            key = (test, n, sim, method, __random_generator(random_state, n, test)[1])
+            __store_put(__options['null_store'], key, res[test])
+            __null_cache.pop(key, None)
+    finally:
+        __options.update(old)
+    
+    return n
+
+
+def warm_cache(tests = 'all', n = range(10, 101), sim = 20000, random_state = 0, method = 'mc', jobs = 1, verbose = False):
+    """
+    This function precomputes seeded null distributions into the on-disk null store (option null_store), in
+    parallel and resuming after an interruption: sample sizes whose nulls are already stored are skipped.
+    Later calls with the same tests, sample sizes, sim, random_state, method and cache options then read the
+    nulls from the store instead of simulating them.
+    Input:
+        tests: name of a homogeneity test, a list of names or 'all' (default, the single change-point tests)
+        n: iterable of sample sizes (default range(10, 101))
+        sim: No. of simulation (default 20000)
+        random_state: seed (int or SeedSequence) of the simulation (default 0)
+        method: 'mc', 'qmc' or 'control' (default 'mc')
+        jobs: No. of worker processes (default 1)
+        verbose: if True, print progress and throughput to stderr (default False)
+    Output:
+        n_nulls: No. of null distributions simulated
+        n_skipped: No. of null distributions already in the store
+        seconds: elapsed time
+        series_per_second: simulated series per second
+    Examples
+    --------
+      >>> import pyhomogeneity as hg
+      >>> hg.set_options(null_store='nulls.phg', compact_cache=True)
+      >>> hg.warm_cache('all', range(10, 2001), sim=100000, random_state=42, jobs=32)
+      >>> res = hg.snht_test(x, sim=100000, random_state=42)
+    """
+    res = namedtuple('Warm_Cache', ['n_nulls', 'n_skipped', 'seconds', 'series_per_second'])
+    tests = [t for t in __tests if t not in __two_break] if tests == 'all' else [tests] if isinstance(tests, str) else list(tests)
+    store = __options['null_store']
+    
+    if [test for test in tests if test not in __tests]:
+        raise ValueError('Unknown homogeneity test(s): {}'.format(', '.join(t for t in tests if t not in __tests)))
+    
+    if method not in __methods:
+        raise ValueError('Unknown p-value method: {}'.format(method))
+    
+    if not store:
+        raise ValueError('warm_cache needs a null store, set the null_store option.')
+    
+    if random_state is None or isinstance(random_state, np.random.Generator):
+        raise ValueError('warm_cache needs a seed (int or SeedSequence) as random_state.')
+    
+    todo = []
+    skipped = 0
+    
+    for size in sorted(set(int(v) for v in n), reverse=True):
+        missing = [test for test in tests
+                   if __store_get(store, (test, size, sim, method, __random_generator(random_state, size, test)[1])) is None]
+        skipped += len(tests) - len(missing)
+        
+        if missing:
+            todo.append((dict(__options), missing, size, sim, random_state, method))
+    
+    start = time.time()
+    done = series = 0
+    sizes = dict((args[2], len(args[1])) for args in todo)
+    pool = multiprocessing.Pool(jobs) if jobs > 1 and len(todo) > 1 else None
+    
+    try:
+        # largest sample sizes first, so the slowest tasks do not finish last
+        for size in (pool.imap_unordered(__warm_one, todo) if pool else map(__warm_one, todo)):
+            done += sizes[size]
+            series += __n_sim(method, sim) * (sizes[size] if not __options['common_random_numbers'] else 1)
+            
+            if verbose:
+                elapsed = time.time() - start
+                sys.stderr.write('n={}: {}/{} nulls, {:.1f} nulls/s, {:.0f} series/s\n'.format(
+                    size, done, sum(sizes.values()), done / elapsed, series / elapsed))
+    finally:
+        if pool:
+            pool.terminate()
+    
+    seconds = time.time() - start
+    
+    return res(done, skipped, seconds, series / seconds if seconds > 0 else 0.0)
+
+
+def clear_null_cache():
+    """
+    This function empties the in-memory cache of simulated null distributions.
+    """
+    __null_cache.clear()
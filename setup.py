@@ -25,14 +25,13 @@ setup(
     url = "https://github.com/mmhs013/pyhomogeneity",
     packages = ["pyhomogeneity"],
     license = __license__,
-    install_requires = ["numpy", "scipy"],
+    python_requires = ">=3.8",
+    install_requires = ["numpy>=1.22", "scipy>=1.7"],
     classifiers = [
-		"Programming Language :: Python :: 2.7",
-		"Programming Language :: Python :: 3.4",
-		"Programming Language :: Python :: 3.5",
-		"Programming Language :: Python :: 3.6",
-        "Programming Language :: Python :: 3.7",
 		"Programming Language :: Python :: 3.8",
+		"Programming Language :: Python :: 3.9",
+		"Programming Language :: Python :: 3.10",
+		"Programming Language :: Python :: 3.11",
         "License :: OSI Approved :: MIT License",
 		"Intended Audience :: Science/Research",
 		"Operating System :: OS Independent",
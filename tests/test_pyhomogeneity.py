@@ -103,4 +103,612 @@ def test_buishand_u_test(sample_data):
     assert res.p == None
     assert res.U == 0.0644043126990563
     assert res.avg.mu1 == 157.87285223367698
-    assert res.avg.mu2 == 120.93548387096774
\ No newline at end of file
+    assert res.avg.mu2 == 120.93548387096774
+
+def test_ragged_test(sample_data):
+    offsets = [0, 120, 121, 360]
+    tests = {'pettitt': hg.pettitt_test, 'snht': hg.snht_test, 'buishand_q': hg.buishand_q_test,
+             'buishand_range': hg.buishand_range_test, 'buishand_likelihood_ratio': hg.buishand_likelihood_ratio_test,
+             'buishand_u': hg.buishand_u_test}
+    
+    for test, func in tests.items():
+        res = hg.ragged_test(sample_data, offsets, test, sim=None)
+        assert np.isnan(res.stat[1]) and np.isnan(res.h[1])
+        assert np.isnan(res.h).all() == (test != 'pettitt')
+        
+        for i in [0, 2]:
+            single = func(sample_data[offsets[i]:offsets[i+1]], sim=None)
+            assert res.cp[i] == single.cp
+            assert np.isclose(res.stat[i], single[3])
+            assert np.isclose(res.mu1[i], single.avg.mu1)
+            assert np.isclose(res.mu2[i], single.avg.mu2)
+    
+    res = hg.ragged_test(sample_data, offsets, 'snht', sim=100, lazy=True, random_state=1)
+    assert np.isnan(res[1:].h[0]) and set(res.h[[0, 2]]) <= {0.0, 1.0}
+
+
+def test_grouped_test(sample_data):
+    pd = pytest.importorskip('pandas')
+    df = pd.DataFrame({'station': np.repeat(['b', 'a'], 180), 'day': np.tile(np.arange(180)[::-1], 2), 'value': sample_data})
+    df = df.sample(frac=1, random_state=1)
+    
+    res = hg.grouped_test(df, by='station', value='value', test='pettitt', sim=None, time='day')
+    assert list(res.station) == ['a', 'b']
+    
+    single = hg.pettitt_test(sample_data[180:][::-1], sim=None)
+    assert res.cp[0] == single.cp - 1
+    assert np.isclose(res.stat[0], single.U)
+    assert np.isclose(res.p[0], single.p)
+    assert np.isclose(res.mu1[0], single.avg.mu1)
+    
+    df['station'] = df.station.astype(object)
+    df.loc[df.station.eq('a') & df.day.eq(0), 'station'] = None
+    res = hg.grouped_test(df, by='station', value='value', test='pettitt', sim=None, time='day')
+    assert list(res.station) == ['a', 'b']
+    single = hg.pettitt_test(sample_data[180:-1][::-1], sim=None)
+    assert np.isclose(res.stat[0], single.U)
+
+
+def test_batch_test():
+    rs = np.random.RandomState(0)
+    x = rs.randn(120, 4) + np.arange(120)[:, None] * 0.05
+    x[3, 1] = np.nan
+    
+    res = hg.batch_test(x, 'buishand_q', sim=None)
+    assert np.isclose(res.stat[1], hg.buishand_q_test(x[:, 1], sim=None).Q)
+    assert res.cp[1] == float(hg.buishand_q_test(x[:, 1], sim=None).cp)
+    
+    res = hg.batch_test(x, 'snht', sim=None, detrend=True, prewhiten=True)
+    
+    for j in [0, 1]:
+        v = ~np.isnan(x[:, j])
+        t = np.arange(120.)
+        y = x[:, j] - np.polyfit(t[v], x[v, j], 1)[0] * t
+        y -= np.nanmean(y)
+        e = np.nan_to_num(y)
+        phi = (e[1:] * e[:-1]).sum() / (e ** 2).sum()
+        z = np.r_[y[0] * np.sqrt(1 - phi ** 2), y[1:] - phi * y[:-1]]
+        z[1:][np.isnan(y[:-1])] = y[1:][np.isnan(y[:-1])] * np.sqrt(1 - phi ** 2)
+        assert np.isclose(res.stat[j], hg.snht_test(z[~np.isnan(z)], sim=None).T)
+    
+    assert list(res.n_eff) == [120, 119, 120, 120]
+
+
+def test_deseasonalize():
+    pd = pytest.importorskip('pandas')
+    rs = np.random.RandomState(0)
+    t = pd.date_range('1990-01-01', periods=360, freq='MS')
+    x = pd.Series(10 * np.sin(2 * np.pi * t.month / 12) + rs.randn(360), index=t)
+    x.iloc[7] = np.nan
+    
+    anomaly = x - x.groupby(t.month).transform('mean')
+    res = hg.snht_test(x, sim=None, deseasonalize='month')
+    assert np.isclose(res.T, hg.snht_test(anomaly, sim=None).T)
+    assert res.cp == hg.snht_test(anomaly, sim=None).cp
+    
+    batch = hg.batch_test(pd.concat([x, 2 * x], axis=1), 'snht', sim=None, deseasonalize='month')
+    assert np.allclose(batch.stat, res.T)
+    
+    day = pd.Series(rs.randn(731), index=pd.date_range('2000-01-01', periods=731))
+    res = hg.buishand_u_test(day, sim=None, deseasonalize='dayofyear')
+    doy = day.index.dayofyear - (day.index.is_leap_year & (day.index.dayofyear >= 60))
+    assert np.isclose(res.U, hg.buishand_u_test(day - day.groupby(doy).transform('mean'), sim=None).U)
+    
+    with pytest.raises(ValueError):
+        hg.snht_test(np.random.rand(50), deseasonalize='month')
+    
+    # one value per season: every anomaly would be 0
+    with pytest.raises(ValueError):
+        hg.snht_test(day[:365], sim=1000, deseasonalize='dayofyear')
+    
+    with np.errstate(invalid='ignore'):
+        res = hg.snht_test(np.ones(20), sim=100, random_state=1)
+    
+    assert np.isnan(res.T) and np.isnan(res.p) and res.h is None
+
+
+def test_by_period():
+    pd = pytest.importorskip('pandas')
+    rs = np.random.RandomState(0)
+    t = pd.date_range('1980-01-01', periods=480, freq='MS')
+    df = pd.DataFrame(rs.randn(480, 2), index=t)
+    df.iloc[300:, 1] += 1.5
+    df.iloc[5, 0] = np.nan
+    
+    res = hg.batch_test(df, 'buishand_range', sim=1000, random_state=1, by_period='month')
+    assert len(res) == 24 and res.n_eff[5] == 39
+    
+    for j, m in [(0, 5), (1, 11)]:
+        single = hg.buishand_range_test(df[j][t.month == m + 1], sim=1000, random_state=1)
+        assert np.isclose(res.stat[12 * j + m], single.R) and res.p[12 * j + m] == single.p
+        assert str(t[int(res.cp[12 * j + m]) - 1].date()) == single.cp
+    
+    labels = np.where(t.year < 2000, 'early', 'late')
+    res = hg.batch_test(df.to_numpy(), 'snht', sim=None, by_period=labels)
+    assert np.isclose(res.stat[3], hg.snht_test(df[1].to_numpy()[240:], sim=None).T)
+    assert res.cp[3] == 240 + hg.snht_test(df[1].to_numpy()[240:], sim=None).cp
+    
+    with pytest.raises(ValueError, match='by_period'):
+        hg.batch_test(df, 'snht', sim=None, by_period='week')
+
+
+def test_multiresolution():
+    pd = pytest.importorskip('pandas')
+    rs = np.random.RandomState(0)
+    t = pd.date_range('2000-01-01', periods=24 * 365 * 3, freq='h')
+    x = pd.Series(rs.randn(len(t)), index=t)
+    x[t >= '2001-07-15'] += 0.3
+    x.iloc[100:300] = np.nan
+    
+    res = hg.multiresolution_test(x, ('D', 'M'), 'snht', sim=1000, random_state=1)
+    assert len(res) == 2 and res.h.all()
+    
+    for j, freq in enumerate(['D', 'MS']):
+        agg = x.resample(freq).mean()
+        single = hg.snht_test(agg.to_numpy(), sim=1000, random_state=1)
+        assert np.isclose(res.stat[j], single.T) and res.p[j] == single.p
+        assert res.cp[j] == x.index[x.index < agg.index[single.cp]][-1]
+    
+    utc = hg.multiresolution_test(x.tz_localize('UTC'), ('D', 'M'), 'snht', sim=None)
+    assert np.allclose(utc.stat, res.stat) and list(utc.cp) == list(res.cp)
+    assert hg.multiresolution_test(x.set_axis(x.index.astype(str)), (24,), 'snht', sim=None).cp[0] > 0
+    
+    res = hg.multiresolution_test(x.to_numpy(), (24,), 'pettitt', sim=None)
+    assert res.cp[0] % 24 == 0 and np.isclose(res.stat[0], hg.pettitt_test(x.resample('D').mean().to_numpy(), sim=None).U)
+    
+    with pytest.raises(ValueError):
+        hg.multiresolution_test(x.to_numpy(), ('D',))
+
+
+def test_stream(tmp_path):
+    rs = np.random.RandomState(0)
+    x = rs.randn(5003).astype('float32')
+    x[2000:] += 0.2
+    x[[5, 77, 3000]] = np.nan
+    x.tofile(str(tmp_path / 'x.f4'))
+    mm = np.memmap(str(tmp_path / 'x.f4'), dtype='float32', mode='r')
+    
+    for test, f in [('snht', hg.snht_test), ('buishand_q', hg.buishand_q_test), ('buishand_range', hg.buishand_range_test),
+                    ('buishand_likelihood_ratio', hg.buishand_likelihood_ratio_test), ('buishand_u', hg.buishand_u_test)]:
+        single = f(x.astype(float), sim=None)
+        
+        for data in [mm, [x[:100], x[100:]], lambda: (x[i:i + 999] for i in range(0, len(x), 999))]:
+            res = hg.stream_test(data, test, chunk=777)
+            assert np.isclose(res.stat, single[3]) and res.cp == single.cp and res.n == 5000
+            assert np.allclose(res.avg, single.avg)
+            assert res.h and 0 <= res.p < 1e-4
+    
+    res = hg.stream_test(mm, 'buishand_q', sim=1000, random_state=1, method='mc')
+    assert res.p == hg.p_value('buishand_q', res.stat, 5000, sim=1000, random_state=1).p
+    
+    # above chunk, simulated p-values only come from cached or stored nulls
+    hg.clear_null_cache()
+    
+    with pytest.raises(ValueError):
+        hg.stream_test(mm, 'buishand_q', sim=1000, chunk=1000, random_state=1, method='mc')
+    
+    hg.p_value('buishand_q', 1.0, 5000, sim=1000, random_state=1)
+    assert hg.stream_test(mm, 'buishand_q', sim=1000, chunk=1000, random_state=1, method='mc').p == res.p
+    
+    # asymptotic p-values are about uniform under the null
+    X = rs.randn(500, 1000)
+    
+    for test in ['snht', 'buishand_q', 'buishand_u']:
+        p = np.array([hg.stream_test(c, test).p for c in X.T])
+        assert 0.02 < (p < 0.05).mean() < 0.08
+    
+    with pytest.raises(ValueError):
+        hg.stream_test(iter([x]), 'snht')
+    
+    with pytest.raises(ValueError):
+        hg.stream_test(mm, 'pettitt')
+
+
+def test_stream_pettitt():
+    rs = np.random.RandomState(0)
+    x = np.round(rs.randn(20003) * 2)
+    x[8000:] += 1
+    x[[5, 77, 15000]] = np.nan
+    single = hg.pettitt_test(x, sim=None)
+    
+    res = hg.stream_pettitt_test(x, eps=1e-5, chunk=30000)
+    assert res.U == single.U and res.cp == single.cp and np.isclose(res.p, single.p)
+    assert res.U_err == 0 and res.cp_range == (single.cp, single.cp) and np.allclose(res.avg, single.avg)
+    
+    hg.set_options(threads=2)
+    
+    try:
+        for eps, chunk in [(1e-3, 3000), (1e-3, 30000), (1e-4, 1000)]:
+            res = hg.stream_pettitt_test([x[i:i + chunk] for i in range(0, len(x), chunk)], eps=eps)
+            assert 0 < res.U_err and abs(res.U - single.U) <= res.U_err
+            assert res.cp_range[0] <= single.cp <= res.cp_range[1] and res.n == 20000
+    finally:
+        hg.set_options(threads=1)
+
+
+def test_cp_confidence():
+    rs = np.random.RandomState(0)
+    x = rs.randn(200)
+    x[120:] += 1
+    
+    res = hg.cp_confidence(x, 'snht', n_boot=500, random_state=1, chunk=10000)
+    assert res.cp == hg.snht_test(x, sim=None).cp and res.lower <= res.cp <= res.upper
+    assert res.lower <= 120 <= res.upper and res.upper - res.lower < 40
+    
+    hg.set_options(threads=2)
+    
+    try:
+        assert hg.cp_confidence(x, 'snht', n_boot=500, random_state=1, chunk=10000) == res
+    finally:
+        hg.set_options(threads=1)
+    
+    narrow = hg.cp_confidence(x, 'snht', level=0.5, n_boot=500, random_state=1)
+    assert res.lower <= narrow.lower <= narrow.upper <= res.upper
+    
+    pd = pytest.importorskip('pandas')
+    t = pd.date_range('2000-01-01', periods=200, freq='MS')
+    res = hg.cp_confidence(pd.Series(x, index=t), 'pettitt', n_boot=200, random_state=0)
+    assert res.cp == hg.pettitt_test(pd.Series(x, index=t), sim=None).cp and res.lower <= res.cp <= res.upper
+
+
+def test_power_curve():
+    res = hg.power_curve('snht', n=[30, 100], shifts=np.linspace(0, 2, 9), sim=1000, null_sim=5000, random_state=0, chunk=10**5)
+    assert res.power.shape == (2, 9, 3) and res.mds.shape == (2, 3)
+    assert np.all(abs(res.power[:, 0] - 0.05) < 0.025) and np.all(res.power[:, -1] > 0.95)
+    assert np.all(np.diff(res.power, axis=1) >= -0.02)
+    assert np.all(res.mds[1] < res.mds[0]) and res.mds[1, 1] < res.mds[1, 0]
+    
+    again = hg.power_curve('snht', n=100, shifts=np.linspace(0, 2, 9), sim=1000, null_sim=5000, random_state=0)
+    assert np.array_equal(again.power, res.power[1]) and np.allclose(again.mds, res.mds[1])
+    
+    res = hg.power_curve('pettitt', n=50, shifts=(0, 0.1), positions=(0.5,), sim=200, null_sim=2000, random_state=0, target=0.99)
+    assert res.power.shape == (2, 1) and np.isnan(res.mds[0])
+
+
+def test_two_break():
+    rs = np.random.RandomState(0)
+    x = rs.randn(40)
+    x[10:25] += 1.5
+    
+    # brute force over all pairs of break points
+    z = (x - x.mean()) / x.std(ddof=1)
+    T = dict(((a, b), a * z[:a].mean()**2 + (b - a) * z[a:b].mean()**2 + (40 - b) * z[b:].mean()**2) for a in range(1, 39) for b in range(a + 1, 40))
+    a, b = max(T, key=T.get)
+    
+    res = hg.snht_two_shift_test(x, sim=1000, random_state=0)
+    assert np.isclose(res.T, T[(a, b)]) and res.cp == (a, b) and res.h
+    assert np.isclose(res.avg.mu2, x[a:b].mean())
+    
+    h = np.clip((np.arange(1, 41) - 15) / 10, 0, 1) - np.clip((np.arange(1, 41) - 15) / 10, 0, 1).mean()
+    res = hg.snht_trend_test(x, sim=None)
+    assert res.T >= (h @ z)**2 / (h @ h) and res.T >= hg.snht_test(x, sim=None).T - 1e-9
+    
+    values = np.r_[x, rs.randn(25)]
+    batch = hg.ragged_test(values, [0, 40, 65], 'snht_two_shift', sim=1000, random_state=0)
+    assert np.isclose(batch.stat[0], hg.snht_two_shift_test(x, sim=None).T) and batch.p[0] == hg.snht_two_shift_test(x, sim=1000, random_state=0).p
+    assert np.isclose(batch.stat[1], hg.snht_two_shift_test(values[40:], sim=None).T)
+    
+    with pytest.raises(ValueError):
+        hg.snht_trend_test(x, sim=100, method='importance')
+
+
+def test_variance_lr():
+    rs = np.random.RandomState(0)
+    x = rs.randn(120)
+    x[70:] *= 2
+    
+    d = x - x.mean()
+    L = [120 * np.log((d**2).mean()) - k * np.log((d[:k]**2).mean()) - (120 - k) * np.log((d[k:]**2).mean()) for k in range(2, 119)]
+    
+    res = hg.variance_lr_test(x, sim=1000, random_state=0)
+    assert np.isclose(res.L, max(L)) and res.cp == np.argmax(L) + 2 and res.h
+    assert np.isclose(res.sd.sd2, x[res.cp:].std(ddof=1))
+    
+    X = rs.randn(80, 4)
+    X[40:, 1] *= 2.5
+    batch = hg.batch_test(X, ['snht', 'variance_lr'], sim=1000, random_state=0)
+    assert sorted(batch) == ['snht', 'variance_lr'] and batch['variance_lr'].h[1]
+    
+    for j in range(4):
+        single = hg.variance_lr_test(X[:, j], sim=1000, random_state=0)
+        assert np.isclose(batch['variance_lr'].stat[j], single.L) and batch['variance_lr'].p[j] == single.p
+        assert batch['variance_lr'].cp[j] == single.cp and batch['snht'].p[j] == hg.snht_test(X[:, j], sim=1000, random_state=0).p
+        assert np.allclose([batch['variance_lr'].mu1[j], batch['variance_lr'].mu2[j]], single.sd)
+    
+    # series too short for the test are not tested
+    res = hg.variance_lr_test([1., 2., 5.], sim=1000, random_state=0)
+    assert np.isnan(res.L) and res.h is None and res.p is None
+    assert hg.snht_trend_test([1., 2.], sim=None).h is None
+    
+    for test, n in [('variance_lr', 4), ('snht_two_shift', 3)]:
+        batch = hg.ragged_test(np.r_[X[:n - 1, 0], X[:, 0]], [0, n - 1, n + 79], test, sim=200, random_state=0)
+        assert np.isnan([batch.stat[0], batch.p[0], batch.h[0]]).all() and not np.isnan(batch.p[1])
+
+
+def test_batch_result(sample_data):
+    res = hg.ragged_test(sample_data, [0, 180, 360], 'snht', sim=500)
+    assert len(res) == 2
+    assert res.stat_name == 'T'
+    assert list(res.n_eff) == [175, 178]
+    assert list(res.n_sim) == [500, 500]
+    assert res[1].p == res.p[1]
+    assert list(res[0:2].cp) == list(res.cp) and res[np.array([1])].p[0] == res.p[1]
+    assert res.to_records()['cp'][0] == res.cp[0]
+    
+    pd = pytest.importorskip('pandas')
+    df = res.to_pandas()
+    assert list(df.columns) == list(hg.BatchResult.fields)
+    assert np.shares_memory(df['stat'].to_numpy(), res.stat)
+
+
+def test_lazy_result(sample_data):
+    res = hg.snht_test(sample_data, sim=1000, lazy=True)
+    assert res.pending is not None
+    assert res.cp == 298
+    assert res.T == 2.4426594259172947
+    assert res.pending is not None
+    
+    lazy = [res, hg.snht_test(sample_data[::-1], sim=1000, lazy=True), hg.ragged_test(sample_data, [0, 180, 360], sim=1000, lazy=True)]
+    resolved = hg.resolve(lazy)
+    assert res.pending is None
+    assert resolved[0].p == res.p
+    assert resolved[0].h == (0.05 > res.p)
+    
+    h, cp, p, T, mu = res
+    assert 0 <= p <= 1
+    assert resolved[2].p.shape == (2,)
+
+
+def test_random_state(sample_data):
+    hg.clear_null_cache()
+    p1 = hg.buishand_u_test(sample_data, sim=2000, random_state=7).p
+    hg.clear_null_cache()
+    assert hg.buishand_u_test(sample_data, sim=2000, random_state=7).p == p1
+    assert hg.buishand_u_test(sample_data, sim=2000, random_state=np.random.default_rng(7)).p != None
+    
+    old = hg.set_options(dtype='float32', bit_generator='Philox')
+    try:
+        assert 0 <= hg.snht_test(sample_data, sim=2000, random_state=7).p <= 1
+    finally:
+        hg.set_options(**old)
+    
+    assert hg.get_options()['dtype'] == 'float64'
+    
+    with pytest.raises(ValueError):
+        hg.set_options(bit_generator='NoSuchGenerator')
+
+
+def test_p_value():
+    for method in ['mc', 'qmc', 'control']:
+        res = hg.p_value('snht', 7.5, 100, sim=2048, method=method, random_state=3)
+        assert 0.05 < res.p < 0.2
+        assert 0 < res.se < 0.02
+        assert res.n_sim == 2048
+    
+    # the No. of qmc scrambles is part of the cache key
+    res = hg.p_value('snht', 7.5, 100, sim=2048, method='qmc', random_state=3)
+    old = hg.set_options(qmc_replicates=4)
+    
+    try:
+        fresh = hg.p_value('snht', 7.5, 100, sim=2048, method='qmc', random_state=3)
+        hg.clear_null_cache()
+        assert fresh == hg.p_value('snht', 7.5, 100, sim=2048, method='qmc', random_state=3)
+    finally:
+        hg.set_options(**old)
+    
+    assert res == hg.p_value('snht', 7.5, 100, sim=2048, method='qmc', random_state=3)
+    
+    res = hg.ragged_test(np.random.rand(150), [0, 50, 150], 'buishand_u', sim=1024, method='control', random_state=1)
+    assert (res.p_se > 0).all()
+    
+    for test, stat in [('snht', 7.5), ('buishand_u', 0.3), ('pettitt', 1200)]:
+        mc = hg.p_value(test, stat, 100, sim=20000, random_state=4)
+        res = hg.p_value(test, stat, 100, sim=4000, method='importance', random_state=4)
+        assert abs(res.p - mc.p) < 4 * (res.se + mc.se)
+    
+    res = hg.p_value('snht', 40, 100, sim=2000, method='importance', random_state=4)
+    assert 0 < res.p < 1e-7 and res.se < res.p / 10
+    
+    with pytest.raises(ValueError):
+        hg.p_value('snht', 7.5, 100, method='antithetic')
+
+
+def test_gpd_tail():
+    old = hg.set_options(tail='gpd')
+    
+    try:
+        res = hg.p_value('snht', [7.5, 20, 25], 60, sim=20000, random_state=1)
+        mc = hg.p_value('snht', 7.5, 60, sim=20000, random_state=1)
+        assert res.p[0] == mc.p
+        assert 0 < res.p[2] < res.p[1] < 1 / 20000
+        assert (res.se[1:] > 0).all()
+        
+        with pytest.raises(ValueError):
+            hg.set_options(tail='gev')
+    finally:
+        hg.set_options(**old)
+
+
+def test_permutation():
+    rs = np.random.RandomState(0)
+    x = np.where(rs.rand(60) < 0.5, 0, rs.gamma(1, 10, 60))
+    x[40:] *= 2
+    
+    res = hg.pettitt_test(x, sim=4000, method='permutation', random_state=1)
+    perm = np.array([rs.permutation(x) for _ in range(4000)])
+    ref = hg.ragged_test(perm.ravel(), np.arange(0, perm.size + 1, 60), 'pettitt', sim=None)
+    assert abs(res.p - (ref.stat >= res.U).mean()) < 0.015
+    
+    old = hg.set_options(threads=3)
+    
+    try:
+        batch = hg.ragged_test(np.r_[x, x, [1., np.nan]], [0, 60, 120, 122], 'snht', sim=1000,
+                               method='permutation', random_state=2)
+        assert np.isnan(batch.p[2]) and batch.p[0] == batch.p[1]
+    finally:
+        hg.set_options(**old)
+    
+    assert batch.p[0] == hg.ragged_test(np.r_[x, x], [0, 60, 120], 'snht', sim=1000,
+                                        method='permutation', random_state=2).p[0]
+    
+    with pytest.raises(ValueError):
+        hg.p_value('snht', 5, 60, method='permutation')
+
+
+def test_block_bootstrap():
+    rs = np.random.RandomState(0)
+    x = rs.randn(100, 80)
+    
+    for i in range(1, 80):
+        x[:, i] += 0.6 * x[:, i - 1]
+    
+    offsets = np.arange(0, x.size + 1, 80)
+    mc = hg.ragged_test(x.ravel(), offsets, 'snht', sim=1000, random_state=1)
+    
+    for bootstrap in ['stationary', 'moving']:
+        old = hg.set_options(bootstrap=bootstrap)
+        
+        try:
+            res = hg.ragged_test(x.ravel(), offsets, 'snht', sim=200, method='block_bootstrap', random_state=1)
+        finally:
+            hg.set_options(**old)
+        
+        assert res.h.mean() < mc.h.mean() / 2
+        assert (res.n_sim == 200).all()
+    
+    res = hg.buishand_q_test(x[0], sim=200, method='block_bootstrap', random_state=1)
+    assert 0 <= res.p <= 1
+    
+    old = hg.set_options(bootstrap='moving', block_length=2.5)
+    
+    try:
+        res = hg.buishand_q_test(x[0], sim=200, method='block_bootstrap', random_state=1)
+    finally:
+        hg.set_options(**old)
+    
+    assert 0 <= res.p <= 1
+    
+    with pytest.raises(ValueError):
+        hg.set_options(bootstrap='circular')
+    
+    with pytest.raises(ValueError):
+        hg.set_options(block_length=0.5)
+
+
+def test_ar1():
+    rs = np.random.RandomState(0)
+    x = rs.randn(100, 80)
+    
+    for i in range(1, 80):
+        x[:, i] += 0.5 * x[:, i - 1]
+    
+    offsets = np.arange(0, x.size + 1, 80)
+    mc = hg.ragged_test(x.ravel(), offsets, 'buishand_q', sim=1000, random_state=1)
+    res = hg.ragged_test(x.ravel(), offsets, 'buishand_q', sim=1000, method='ar1', random_state=1)
+    assert res.h.mean() < mc.h.mean() / 2
+    
+    single = hg.buishand_q_test(x[3], sim=1000, method='ar1', random_state=1)
+    assert np.isclose(single.p, res.p[3])
+    
+    # interpolation between the nulls of the grid points around phi
+    p = hg.p_value('snht', 8, 80, sim=1000, method='ar1', phi=[0.3, 0.325, 0.35], random_state=1).p
+    assert p[1] == pytest.approx((p[0] + p[2]) / 2)
+    assert hg.p_value('snht', 8, 80, sim=1000, method='ar1', phi=0, random_state=1).p == \
+        hg.p_value('snht', 8, 80, sim=1000, random_state=1).p
+
+
+def test_compact_cache():
+    stat = np.linspace(0, 20, 401)
+    hg.clear_null_cache()
+    full = hg.p_value('snht', stat, 50, sim=5000, random_state=1)
+    old = hg.set_options(compact_cache=True, sketch_error=0.02)
+    
+    try:
+        hg.clear_null_cache()
+        hg.p_value('snht', stat, 50, sim=5000, random_state=1)
+        res = hg.p_value('snht', stat, 50, sim=5000, random_state=1)
+        assert (res.p >= full.p - 1e-7).all()
+        assert (res.p <= full.p * 1.02 + 1e-7).all()
+        assert res.n_sim == 5000
+    finally:
+        hg.set_options(**old)
+        hg.clear_null_cache()
+
+
+def test_null_store(tmp_path):
+    path = str(tmp_path / 'nulls.phg')
+    old = hg.set_options(null_store=path)
+    
+    try:
+        hg.clear_null_cache()
+        stat = np.linspace(0, 15, 31)
+        res = hg.p_value('snht', stat, 50, sim=2000, method='control', random_state=1)
+        size = os.path.getsize(path)
+        
+        hg.clear_null_cache()
+        stored = hg.p_value('snht', stat, 50, sim=2000, method='control', random_state=1)
+        assert np.array_equal(res.p, stored.p) and np.array_equal(res.se, stored.se)
+        assert os.path.getsize(path) == size
+        
+        # a torn record at the end is ignored and overwritten by the next one
+        with open(path, 'ab') as f:
+            f.write(b'PHRC' + b'\0' * 12)
+        
+        res = hg.p_value('pettitt', 100, 30, sim=1000, random_state=1)
+        hg.clear_null_cache()
+        assert hg.p_value('pettitt', 100, 30, sim=1000, random_state=1).p == res.p
+    finally:
+        hg.set_options(**old)
+        hg.clear_null_cache()
+
+
+def test_warm_cache(tmp_path):
+    from pyhomogeneity.__main__ import main
+    
+    path = str(tmp_path / 'nulls.phg')
+    assert main(['warm-cache', '--tests', 'snht,pettitt', '--n', '10:14', '--sim', '500', '--seed', '3',
+                 '--store', path]) == 0
+    
+    old = hg.set_options(null_store=path, compact_cache=False)
+    
+    try:
+        res = hg.warm_cache(['snht', 'pettitt', 'buishand_u'], [12, 14, 16], sim=500, random_state=3)
+        assert (res.n_nulls, res.n_skipped) == (5, 4)
+        
+        size = os.path.getsize(path)
+        hg.clear_null_cache()
+        hg.snht_test(np.random.rand(12), sim=500, random_state=3)
+        assert os.path.getsize(path) == size
+        
+        with pytest.raises(ValueError):
+            hg.warm_cache('snht', [10], sim=500, random_state=None)
+    finally:
+        hg.set_options(**old)
+        hg.clear_null_cache()
+    
+    # nulls already in the memory cache are written to the store as well
+    for jobs in [1, 2]:
+        hg.p_value('snht', 5, 20, sim=300, random_state=1)
+        old = hg.set_options(null_store=str(tmp_path / 'memory{}.phg'.format(jobs)))
+        
+        try:
+            assert hg.warm_cache('snht', [20, 21, 22], sim=300, random_state=1, jobs=jobs).n_nulls == 3
+            assert hg.warm_cache('snht', [20, 21, 22], sim=300, random_state=1).n_skipped == 3
+        finally:
+            hg.set_options(**old)
+            hg.clear_null_cache()
+
+
+def test_null_distributions():
+    nulls = hg.null_distributions('all', 5, 40, sim=2000, random_state=7)
+    assert sorted(nulls['snht']) == list(range(5, 41))
+    
+    for test in ['pettitt', 'snht', 'buishand_u', 'variance_lr']:
+        stat = np.quantile(nulls[test][40], [0.5, 0.9])
+        res = hg.p_value(test, stat, 40, sim=2000, random_state=7)
+        assert np.allclose(res.p, (nulls[test][40] > stat[:, None]).mean(axis=1))
+        direct = hg.null_distributions(test, 17, 17, sim=2000, random_state=8)[test][17]
+        assert abs(np.median(nulls[test][17]) / np.median(direct) - 1) < 0.1
+    
+    with pytest.raises(ValueError):
+        hg.null_distributions('snht', 40, 5)